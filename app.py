@@ -1,94 +1,235 @@
+import sys
+
+import cli
+
+# Headless commands (e.g. `python app.py export project.json out.txt`) are
+# dispatched before tkinter is imported, so they run without a display.
+if __name__ == "__main__" and cli.is_headless(sys.argv[1:]):
+    sys.exit(cli.main(sys.argv[1:]))
+
 import tkinter as tk
-from tkinter import messagebox, simpledialog, colorchooser
-import json
-import os
-import re
+from tkinter import messagebox, simpledialog, colorchooser, ttk
+import io
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+
+from model import WorkspaceModel
+from persistence import atomic_write
+from binproject import EXTENSION as BINARY_EXTENSION
+from chunkstore import EXTENSION as CHUNKED_EXTENSION, MANIFEST as CHUNKED_MANIFEST
+from widgetpool import WidgetPool
+from tasks import BackgroundTask
+from instrument import APP_HOOKS, DEFAULT_DUMP_PATH, MODEL_HOOKS, PLAN_HOOKS, STORE_HOOKS, Instrumentation, format_report as format_instrumentation
+from diagnostics import LatencyStats, RenderDiagnostics, StartupProfile, format_latency, format_report
+from templates import compile_template, split_select_value
+from workspace import parse_cell_key
+
+# Build widgets only for the part of the workspace visible in the canvas.
+# False falls back to one Frame per cell for the whole grid.
+VIRTUAL_GRID = True
+# Extra rows/columns built around the visible area so small scrolls don't flicker
+GRID_OVERSCAN = 2
+
+# Palette panels kept built (one per category) before the least recently used is destroyed
+PALETTE_CACHE_SIZE = 8
+
+# Classic grid: rows built before the window is handed back to the event loop;
+# the rest are appended GRID_BUILD_CHUNK rows per idle callback
+FIRST_RENDER_ROWS = 30
+GRID_BUILD_CHUNK = 20
+
+# Refresh period (ms) of the --instrument overlay (F11) while it is shown
+OVERLAY_REFRESH_MS = 500
+
+# Poll period (ms) of the export preview window for edited rows
+PREVIEW_REFRESH_MS = 300
+
+# How often (ms) the Tk thread drains a background job's message queue
+TASK_POLL_MS = 50
+
+# Idle widgets kept per kind in the pool; extras are destroyed
+WIDGET_POOL_MAX_FREE = 500
+
+# "overlay": the drag proxy is a label placed over the main window, moved at most
+# once per frame; "window": an override-redirect Toplevel moved on every motion event
+DRAG_PROXY = "overlay"
+DRAG_FRAME_MS = 16
+# Keeps the proxy off the pointer so the widget under it can be hit tested
+DRAG_PROXY_OFFSET = 12
+
+# Fixed cell geometry of the virtual grid (a 150x30 cell plus its 1px padding)
+CELL_W = 152
+CELL_H = 32
+ROW_HEADER_W = 40
+COL_HEADER_H = 22
+
+
+def validate_int(P):
+    if P == "" or P == "-": return True
+    return P.isdigit() or (P.startswith("-") and P[1:].isdigit())
+
+
+# Symbols only: Not alphanumeric
+def validate_sym(P):
+    for char in P:
+        if char.isalnum(): return False
+    return True
+
+
+class CellEditor:
+    # A pooled cell widget (entry, color button, select option group or
+    # static label) and the value slot it currently edits.
+    def __init__(self, kind, widget, var=None, check_var=None, entry=None):
+        self.kind = kind
+        self.widget = widget
+        self.var = var
+        self.check_var = check_var
+        self.entry = entry
+        self.check = None
+        self.trace_id = None
+        self.cell_key = None
+        self.idx = None
 
 class App(tk.Tk):
-    def __init__(self):
+    def __init__(self, profile_startup=False, instrumentation=None):
         super().__init__()
+        self.startup_profile = StartupProfile() if profile_startup else None
+        # instrument.Instrumentation, only with --instrument
+        self.instrumentation = instrumentation
         self.title("Visual Coding App")
         self.geometry("1200x800")
         
         # Data
         self.data_file = "app_data.json"
-        self.data = self.load_data()
+        # Edits only mark the data dirty; one write happens after the idle window.
+        # Cell level edits are appended to the journal instead of rewriting the file.
+        self.model = WorkspaceModel(self.data_file, schedule=self.after, cancel=self.after_cancel,
+                                    profile=self.startup_profile)
+        self.data = self.model.data
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        if instrumentation is not None:
+            # Before setup_ui, so buttons and bindings pick up the timed methods
+            instrumentation.attach(self, APP_HOOKS, "App")
+            instrumentation.attach(self.model, MODEL_HOOKS, "WorkspaceModel")
+            # The debounce timer and close() look flush up on the instance, so they get the timed one
+            instrumentation.attach(self.model.store, STORE_HOOKS, "DebouncedStore")
+            self.model.store.on_write = instrumentation.record_write
+            self.overlay = None
+            self.bind("<F11>", lambda e: self.toggle_overlay())
         
         # UI Layout
         self.setup_ui()
-        
-    def load_data(self):
-        if not os.path.exists(self.data_file):
-            return {"categories": [], "workspace": {}}
-        try:
-            with open(self.data_file, "r") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return {"categories": [], "workspace": {}}
+        # The grid is built once the window is up (the map is already queued as idle work)
+        self.after_idle(self.first_render)
 
-    def save_data(self):
-        with open(self.data_file, "w") as f:
-            json.dump(self.data, f, indent=4)
+    def profile_phase(self, name):
+        if self.startup_profile is None:
+            return nullcontext()
+        return self.startup_profile.phase(name)
 
-    def setup_ui(self):
-        # Configure grid layout
-        self.grid_columnconfigure(1, weight=1)
-        self.grid_rowconfigure(0, weight=1)
+    def first_render(self):
+        with self.profile_phase("grid build (first view)"):
+            self.render_grid()
+        if self._grid_chunk is None:
+            self.finish_startup_profile()
 
-        # Left Panel (Categories)
-        self.left_panel = tk.Frame(self, bg="lightgray", width=200)
-        self.left_panel.grid(row=0, column=0, sticky="ns")
-        self.left_panel.grid_propagate(False)
-        
-        self.create_category_btn = tk.Button(self.left_panel, text="Oluştur", command=self.create_category)
-        self.create_category_btn.pack(pady=10, fill="x")
+    def finish_startup_profile(self):
+        if self.startup_profile is not None:
+            print(self.startup_profile.report())
+            self.startup_profile = None
         
-        self.categories_frame = tk.Frame(self.left_panel, bg="lightgray")
-        self.categories_frame.pack(fill="both", expand=True)
-        
-        # Center Panel (Workspace)
-        self.center_panel = tk.Frame(self, bg="white")
-        self.center_panel.grid(row=0, column=1, sticky="nsew")
+    # Grid size lives in the model; the widgets only follow it
+    @property
+    def max_rows(self):
+        return self.model.max_rows
 
-        # Right Panel (Boxes)
-        self.right_panel = tk.Frame(self, bg="lightgray", width=250)
-        self.right_panel.grid(row=0, column=2, sticky="ns")
-        self.right_panel.grid_propagate(False)
-        
-        self.new_box_btn = tk.Button(self.right_panel, text="Yeni Kutu", command=self.create_box_dialog)
-        self.new_box_btn.pack(pady=10, fill="x")
+    @property
+    def max_cols(self):
+        return self.model.max_cols
 
-        # Initialize UI with data
-        self.refresh_categories()
+    def on_close(self):
+        # Write pending edits before the window goes away
+        try:
+            self.model.close()
+        except OSError as e:
+            if not messagebox.askyesno("Error", f"Could not save data: {e}\nQuit anyway?"):
+                return
+        if self.instrumentation is not None:
+            self.sample_gauges()
+            try:
+                self.instrumentation.dump()
+            except OSError as e:
+                print(f"Could not write {self.instrumentation.dump_path}: {e}", file=sys.stderr)
+        self.destroy()
+
+    def count_widgets(self):
+        count = 0
+        pending = [self]
+        while pending:
+            children = pending.pop().winfo_children()
+            count += len(children)
+            pending.extend(children)
+        return count
+
+    def sample_gauges(self):
+        instrumentation = self.instrumentation
+        instrumentation.set_gauge("widgets alive", self.count_widgets())
+        instrumentation.set_gauge("tcl commands", self.count_tcl_commands())
+        instrumentation.set_gauge("traced variables", self.live_traces)
+        instrumentation.set_gauge("workspace cells", len(self.data["workspace"]))
+
+    def toggle_overlay(self):
+        if self.overlay is not None:
+            self.after_cancel(self.overlay_refresh)
+            self.overlay.destroy()
+            self.overlay = None
+            return
+        self.overlay = tk.Label(self, font=("Courier", 9), justify="left", anchor="nw",
+                                bg="#ffffe0", relief="solid", bd=1)
+        self.overlay.place(relx=1.0, x=-10, y=10, anchor="ne")
+        self.update_overlay()
+
+    def update_overlay(self):
+        self.sample_gauges()
+        self.overlay.config(text=format_instrumentation(self.instrumentation.report()))
+        self.overlay.lift()
+        self.overlay_refresh = self.after(OVERLAY_REFRESH_MS, self.update_overlay)
 
     def create_category(self):
-        new_category = {"name": "Yeni Kategori", "boxes": []}
-        self.data["categories"].append(new_category)
-        self.save_data()
-        self.refresh_categories()
+        index = self.model.create_category()
+        self.add_category_button(index)
 
     def refresh_categories(self):
         # Clear existing buttons
         for widget in self.categories_frame.winfo_children():
             widget.destroy()
+        self.category_buttons = []
             
-        for idx, category in enumerate(self.data["categories"]):
-            btn = tk.Button(self.categories_frame, text=category["name"])
-            btn.pack(fill="x", pady=2)
-            # Bind events for rename (double click) and select (single click)
-            btn.bind("<Double-Button-1>", lambda e, i=idx: self.rename_category(i))
-            btn.bind("<Button-1>", lambda e, i=idx: self.select_category(i))
+        for idx in range(len(self.data["categories"])):
+            self.add_category_button(idx)
+
+    def add_category_button(self, idx):
+        btn = tk.Button(self.categories_frame, text=self.data["categories"][idx]["name"])
+        btn.pack(fill="x", pady=2)
+        # Bind events for rename (double click) and select (single click)
+        btn.bind("<Double-Button-1>", lambda e, i=idx: self.rename_category(i))
+        btn.bind("<Button-1>", lambda e, i=idx: self.select_category(i))
+        self.category_buttons.append(btn)
 
     def rename_category(self, index):
         current_name = self.data["categories"][index]["name"]
         new_name = simpledialog.askstring("Rename Category", "Enter new name:", initialvalue=current_name)
         if new_name:
-            self.data["categories"][index]["name"] = new_name
-            self.save_data()
-            self.refresh_categories()
+            self.model.rename_category(index, new_name)
+            # Only the button's text changes
+            self.category_buttons[index].config(text=new_name)
 
     def select_category(self, index):
         self.current_category_index = index
+        if self.search_var.get():
+            # Clearing the search puts the palette back (see on_search)
+            self.search_var.set("")
         self.refresh_boxes()
 
     def create_box_dialog(self):
@@ -119,30 +260,104 @@ class App(tk.Tk):
     def save_box(self, dialog, content):
         if not content:
             return
-        new_box = {"content": content, "color": self.picked_color}
-        self.data["categories"][self.current_category_index]["boxes"].append(new_box)
-        self.save_data()
-        self.refresh_boxes()
+        box = self.model.add_box(self.current_category_index, content, self.picked_color)
+        panel = self.palette_panels.get(self.current_category_index)
+        if panel is not None:
+            # The cached panel just gets the new box appended
+            self.add_palette_box(panel, box)
+        else:
+            self.refresh_boxes()
+        if self.search_var.get().strip():
+            # The new box may match the current query
+            self.on_search()
         dialog.destroy()
 
     def refresh_boxes(self):
-        for widget in self.right_panel.winfo_children():
-            if widget != self.new_box_btn:
-                widget.destroy()
-
-        if hasattr(self, "current_category_index"):
-            category = self.data["categories"][self.current_category_index]
-            for box in category["boxes"]:
-                box_frame = tk.Frame(self.right_panel, bg=box["color"], bd=1, relief="raised")
-                box_frame.pack(fill="x", padx=5, pady=2)
-                
-                lbl = tk.Label(box_frame, text=box["content"], bg=box["color"], anchor="w")
-                lbl.pack(fill="x", padx=5, pady=5)
-                
-                # Drag events
-                lbl.bind("<Button-1>", lambda e, b=box: self.start_drag(e, b))
-                lbl.bind("<B1-Motion>", self.drag_motion)
-                lbl.bind("<ButtonRelease-1>", self.stop_drag)
+        # Shows the current category's palette. Built panels are kept and
+        # swapped with pack/pack_forget instead of rebuilt on every click.
+        if not hasattr(self, "current_category_index") or self.search_var.get().strip():
+            return
+        index = self.current_category_index
+
+        if self.shown_palette is not None and self.shown_palette != index:
+            panel = self.palette_panels.get(self.shown_palette)
+            if panel is not None:
+                panel.pack_forget()
+
+        panel = self.palette_panels.get(index)
+        if panel is None:
+            panel = self.build_palette_panel(index)
+            self.palette_panels[index] = panel
+        self.palette_panels.move_to_end(index)
+        if self.shown_palette != index:
+            panel.pack(fill="x")
+            self.shown_palette = index
+
+        # Least recently used panels past the budget are destroyed
+        while len(self.palette_panels) > PALETTE_CACHE_SIZE:
+            oldest, old_panel = next(iter(self.palette_panels.items()))
+            if oldest == index:
+                break
+            del self.palette_panels[oldest]
+            old_panel.destroy()
+
+    def on_search(self, *args):
+        query = self.search_var.get()
+        if not query.strip():
+            self.search_panel.pack_forget()
+            self.refresh_boxes()
+            return
+        if self.shown_palette is not None:
+            self.palette_panels[self.shown_palette].pack_forget()
+            self.shown_palette = None
+        self.show_search_results(self.model.palette.search(query))
+        self.search_panel.pack(fill="x")
+
+    def show_search_results(self, results):
+        # Rows are reconfigured in place, a keystroke creates no widgets once enough exist
+        for i, (_, box) in enumerate(results):
+            if i == len(self.search_rows):
+                self.search_rows.append(self.create_search_row(i))
+            frame, label = self.search_rows[i]
+            frame.config(bg=box["color"])
+            label.config(text=box["content"], bg=box["color"])
+            if i >= self.search_shown:
+                frame.pack(fill="x", padx=5, pady=2)
+        for frame, _ in self.search_rows[len(results):self.search_shown]:
+            frame.pack_forget()
+        self.search_boxes = [box for _, box in results]
+        self.search_shown = len(results)
+        if results:
+            self.search_empty.pack_forget()
+        else:
+            self.search_empty.pack(pady=5)
+
+    def create_search_row(self, i):
+        frame = tk.Frame(self.search_panel, bd=1, relief="raised")
+        label = tk.Label(frame, anchor="w")
+        label.pack(fill="x", padx=5, pady=5)
+        label.bind("<Button-1>", lambda e: self.start_drag(e, self.search_boxes[i]))
+        label.bind("<B1-Motion>", self.drag_motion)
+        label.bind("<ButtonRelease-1>", self.stop_drag)
+        return frame, label
+
+    def build_palette_panel(self, index):
+        panel = tk.Frame(self.right_panel, bg="lightgray")
+        for box in self.data["categories"][index]["boxes"]:
+            self.add_palette_box(panel, box)
+        return panel
+
+    def add_palette_box(self, panel, box):
+        box_frame = tk.Frame(panel, bg=box["color"], bd=1, relief="raised")
+        box_frame.pack(fill="x", padx=5, pady=2)
+        
+        lbl = tk.Label(box_frame, text=box["content"], bg=box["color"], anchor="w")
+        lbl.pack(fill="x", padx=5, pady=5)
+        
+        # Drag events
+        lbl.bind("<Button-1>", lambda e, b=box: self.start_drag(e, b))
+        lbl.bind("<B1-Motion>", self.drag_motion)
+        lbl.bind("<ButtonRelease-1>", self.stop_drag)
 
     def setup_ui(self):
         # Configure grid layout
@@ -174,175 +389,682 @@ class App(tk.Tk):
         self.new_box_btn = tk.Button(self.right_panel, text="Yeni Kutu", command=self.create_box_dialog)
         self.new_box_btn.pack(pady=10, fill="x")
 
+        # Search across all categories (WorkspaceModel.palette); results replace the palette
+        self.search_var = tk.StringVar()
+        tk.Entry(self.right_panel, textvariable=self.search_var).pack(padx=5, pady=(0, 10), fill="x")
+        self.search_var.trace_add("write", self.on_search)
+        self.search_panel = tk.Frame(self.right_panel, bg="lightgray")
+        self.search_empty = tk.Label(self.search_panel, text="Sonuç yok", bg="lightgray")
+        self.search_rows = []      # (frame, label), reused for every query
+        self.search_boxes = []     # box shown in each row
+        self.search_shown = 0
+
+        # category index -> built palette panel, least recently shown first
+        self.palette_panels = OrderedDict()
+        self.shown_palette = None
+
         # Initialize UI with data
-        self.refresh_categories()
+        with self.profile_phase("palette build"):
+            self.refresh_categories()
         
         # Drag data
-        self.drag_data = {"x": 0, "y": 0, "item": None, "window": None}
+        self.drag_data = {"x": 0, "y": 0, "item": None, "window": None,
+                          "pending": None, "frame": None, "preview": None}
+        self.drag_proxy = None
+        self.drag_stats = LatencyStats()
 
     def init_workspace(self):
         self.canvas = tk.Canvas(self.center_panel, bg="white")
         self.scrollbar_y = tk.Scrollbar(self.center_panel, orient="vertical", command=self.canvas.yview)
         self.scrollbar_x = tk.Scrollbar(self.center_panel, orient="horizontal", command=self.canvas.xview)
-        self.scrollable_frame = tk.Frame(self.canvas, bg="white")
 
-        self.scrollable_frame.bind(
-            "<Configure>",
-            lambda e: self.canvas.configure(
-                scrollregion=self.canvas.bbox("all")
+        # Cell frames and editors are recycled through the pool instead of destroyed
+        self.widget_pool = WidgetPool(max_free=WIDGET_POOL_MAX_FREE, discard=self.discard_pooled)
+        self.cell_editors = {}       # cell frame -> editors packed in it
+        self.live_traces = 0
+        # Registered once; every int/symbol entry shares the same Tcl commands
+        self.vcmd_int = (self.register(validate_int), '%P')
+        self.vcmd_sym = (self.register(validate_sym), '%P')
+        self.bind("<F9>", lambda e: self.show_pool_stats())
+
+        self.diagnostics = RenderDiagnostics(self.count_tcl_commands, lambda: self.live_traces)
+        self.diagnostics_window = None
+        self.bind("<F10>", lambda e: self.show_diagnostics())
+
+        self.virtual_grid = VIRTUAL_GRID
+        if self.virtual_grid:
+            # Cells are canvas items / canvas windows, rebuilt as the view moves
+            self.cell_rects = {}     # (r, c) -> rectangle item
+            self.cell_windows = {}   # (r, c) -> (frame, window item)
+            self.row_headers = {}    # r -> text item
+            self.col_headers = {}    # c -> (rectangle item, text item)
+            self._visible_pending = None
+
+            self.canvas.bind("<Configure>", lambda e: self.schedule_visible_update())
+            self.canvas.configure(yscrollcommand=self.on_canvas_yscroll, xscrollcommand=self.on_canvas_xscroll)
+            self.cell_parent = self.canvas
+        else:
+            self.scrollable_frame = tk.Frame(self.canvas, bg="white")
+            self.cell_parent = self.scrollable_frame
+            self.header_labels = []
+
+            self.scrollable_frame.bind(
+                "<Configure>",
+                lambda e: self.canvas.configure(
+                    scrollregion=self.canvas.bbox("all")
+                )
             )
-        )
 
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=self.scrollbar_y.set, xscrollcommand=self.scrollbar_x.set)
+            self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
+            self.canvas.configure(yscrollcommand=self.scrollbar_y.set, xscrollcommand=self.scrollbar_x.set)
+            self.grid_cols = 0
+            self.cell_index = {}
+        # Pending idle callback appending the rest of the classic grid
+        self._grid_chunk = None
 
         self.canvas.pack(side="left", fill="both", expand=True)
         self.scrollbar_y.pack(side="right", fill="y")
         self.scrollbar_x.pack(side="bottom", fill="x")
         
-        # Grid System
+        # Grid System (size comes from the model, see WorkspaceModel.init_bounds)
+        # Built by first_render, after the window is shown
         self.grid_cells = [] 
-        
-        # Calculate max rows: max(10, highest_filled_row + 1 + 10)
-        max_r = -1
-        max_c = 9 # Start with 10 columns (0-9)
-        for key in self.data["workspace"].keys():
-            try:
-                r_str, c_str = key.split("_")
-                r, c = int(r_str), int(c_str)
-                if r > max_r: max_r = r
-                if c > max_c: max_c = c
-            except:
-                pass
-        
-        self.max_rows = max(10, max_r + 11)
-        self.max_cols = max_c + 1
-
-        self.render_grid()
 
     def render_grid(self):
-        # Clear existing
-        for w in self.scrollable_frame.winfo_children():
-            w.destroy()
+        if self.virtual_grid:
+            self.render_virtual_grid()
+            return
+
+        # Clear existing: cell frames and editors go back to the pool, headers are destroyed
+        for row_widgets in self.grid_cells:
+            for cell_frame in row_widgets:
+                self.release_cell_contents(cell_frame)
+                cell_frame.grid_forget()
+                self.widget_pool.release("cell", cell_frame)
+        for label in self.header_labels:
+            label.destroy()
+        self.header_labels = []
+        if self._grid_chunk is not None:
+            self.after_cancel(self._grid_chunk)
+            self._grid_chunk = None
         
         self.grid_cells = []
-        
-        # Header (Column Numbers)
-        for c in range(self.max_cols):
-            tk.Label(self.scrollable_frame, text=f"{c}", width=5, bg="lightgray", relief="raised").grid(row=0, column=c+1, sticky="nsew")
-
-        for r in range(self.max_rows):
-            row_widgets = []
-            # Row Number
-            tk.Label(self.scrollable_frame, text=f"{r}:", width=4, anchor="e", bg="lightgray").grid(row=r+1, column=0, sticky="ns")
-            
-            for c in range(self.max_cols):
-                cell_frame = tk.Frame(self.scrollable_frame, bg="white", width=150, height=30, bd=1, relief="solid")
-                cell_frame.grid_propagate(False) # Don't shrink
-                cell_frame.grid(row=r+1, column=c+1, padx=1, pady=1, sticky="nsew")
-                
-                row_widgets.append(cell_frame)
-                
-                cell_key = f"{r}_{c}"
-                if cell_key in self.data["workspace"]:
-                    self.render_box_in_row(cell_frame, self.data["workspace"][cell_key], cell_key)
-            
-            self.grid_cells.append(row_widgets)
+        self.grid_cols = 0
+        # cell frame -> (r, c), so a drop resolves its target without scanning the grid
+        self.cell_index = {}
+
+        # Rows at the top (the ones in view) first, the rest in idle chunks
+        while self.grid_cols < self.max_cols:
+            self.append_grid_column()
+        self.build_grid_rows(FIRST_RENDER_ROWS)
+        self.diagnostics_render("grid")
+
+    def build_grid_rows(self, count):
+        self._grid_chunk = None
+        stop = min(self.max_rows, len(self.grid_cells) + count)
+        while len(self.grid_cells) < stop:
+            self.append_grid_row()
+        if len(self.grid_cells) < self.max_rows:
+            self._grid_chunk = self.after_idle(self.build_remaining_rows)
+
+    def build_remaining_rows(self):
+        with self.profile_phase("grid build (idle chunks)"):
+            self.build_grid_rows(GRID_BUILD_CHUNK)
+        if self._grid_chunk is None:
+            self.finish_startup_profile()
+
+    def grow_grid(self):
+        # Appends only the rows/columns missing up to max_rows x max_cols;
+        # existing cells and headers stay as they are.
+        while self.grid_cols < self.max_cols:
+            self.append_grid_column()
+        while len(self.grid_cells) < self.max_rows:
+            self.append_grid_row()
+
+    def append_grid_column(self):
+        c = self.grid_cols
+        # Header (Column Number)
+        label = tk.Label(self.scrollable_frame, text=f"{c}", width=5, bg="lightgray", relief="raised")
+        label.grid(row=0, column=c+1, sticky="nsew")
+        self.header_labels.append(label)
+        for r, row_widgets in enumerate(self.grid_cells):
+            row_widgets.append(self.create_grid_cell(r, c))
+        self.grid_cols += 1
+
+    def append_grid_row(self):
+        r = len(self.grid_cells)
+        # Row Number
+        label = tk.Label(self.scrollable_frame, text=f"{r}:", width=4, anchor="e", bg="lightgray")
+        label.grid(row=r+1, column=0, sticky="ns")
+        self.header_labels.append(label)
+        self.grid_cells.append([self.create_grid_cell(r, c) for c in range(self.grid_cols)])
+
+    def create_grid_cell(self, r, c):
+        cell_frame = self.widget_pool.acquire(
+            "cell", lambda: tk.Frame(self.scrollable_frame, width=150, height=30, bd=1, relief="solid"))
+        cell_frame.config(bg="white")
+        cell_frame.grid_propagate(False) # Don't shrink
+        cell_frame.grid(row=r+1, column=c+1, padx=1, pady=1, sticky="nsew")
+        self.cell_index[cell_frame] = (r, c)
+
+        cell_key = f"{r}_{c}"
+        if cell_key in self.data["workspace"]:
+            self.render_box_in_row(cell_frame, self.data["workspace"][cell_key], cell_key)
+        return cell_frame
+
+    # --- Virtual grid ---
+
+    def on_canvas_yscroll(self, first, last):
+        self.scrollbar_y.set(first, last)
+        self.schedule_visible_update()
+
+    def on_canvas_xscroll(self, first, last):
+        self.scrollbar_x.set(first, last)
+        self.schedule_visible_update()
+
+    def schedule_visible_update(self):
+        # Several scroll/configure events per frame collapse into one update
+        if self._visible_pending is None:
+            self._visible_pending = self.after_idle(self.update_visible_cells)
+
+    def update_scrollregion(self):
+        width = ROW_HEADER_W + self.max_cols * CELL_W
+        height = COL_HEADER_H + self.max_rows * CELL_H
+        self.canvas.configure(scrollregion=(0, 0, width, height))
+
+    def visible_range(self):
+        # Rows and columns intersecting the canvas viewport, plus overscan
+        left = self.canvas.canvasx(0)
+        top = self.canvas.canvasy(0)
+        right = left + self.canvas.winfo_width()
+        bottom = top + self.canvas.winfo_height()
+
+        c0 = max(0, int((left - ROW_HEADER_W) // CELL_W) - GRID_OVERSCAN)
+        c1 = min(self.max_cols, int((right - ROW_HEADER_W) // CELL_W) + 1 + GRID_OVERSCAN)
+        r0 = max(0, int((top - COL_HEADER_H) // CELL_H) - GRID_OVERSCAN)
+        r1 = min(self.max_rows, int((bottom - COL_HEADER_H) // CELL_H) + 1 + GRID_OVERSCAN)
+        return range(r0, r1), range(c0, c1)
+
+    def cell_origin(self, r, c):
+        return ROW_HEADER_W + c * CELL_W + 1, COL_HEADER_H + r * CELL_H + 1
+
+    def render_virtual_grid(self):
+        # Data under the visible cells may have changed (import), rebuild them
+        for key in list(self.cell_windows):
+            self.release_cell_window(key)
+        self.update_scrollregion()
+        self.update_visible_cells()
+
+    def update_visible_cells(self):
+        self._visible_pending = None
+        rows, cols = self.visible_range()
+        workspace = self.data["workspace"]
+
+        # Drop what scrolled out of view
+        for key in [k for k in self.cell_rects if k[0] not in rows or k[1] not in cols]:
+            self.canvas.delete(self.cell_rects.pop(key))
+        for key in [k for k in self.cell_windows if k[0] not in rows or k[1] not in cols]:
+            self.release_cell_window(key)
+        for r in [r for r in self.row_headers if r not in rows]:
+            self.canvas.delete(self.row_headers.pop(r))
+        for c in [c for c in self.col_headers if c not in cols]:
+            self.canvas.delete(*self.col_headers.pop(c))
+
+        # Add what scrolled in; empty cells are just rectangles
+        for c in cols:
+            if c not in self.col_headers:
+                x, _ = self.cell_origin(0, c)
+                rect = self.canvas.create_rectangle(x, 0, x + CELL_W - 2, COL_HEADER_H - 1,
+                                                    fill="lightgray", outline="gray")
+                text = self.canvas.create_text(x + CELL_W // 2, COL_HEADER_H // 2, text=f"{c}")
+                self.col_headers[c] = (rect, text)
+
+        for r in rows:
+            if r not in self.row_headers:
+                _, y = self.cell_origin(r, 0)
+                self.row_headers[r] = self.canvas.create_text(ROW_HEADER_W - 4, y + CELL_H // 2,
+                                                              text=f"{r}:", anchor="e")
+            for c in cols:
+                if (r, c) not in self.cell_rects:
+                    x, y = self.cell_origin(r, c)
+                    self.cell_rects[(r, c)] = self.canvas.create_rectangle(
+                        x, y, x + CELL_W - 3, y + CELL_H - 3, fill="white", outline="black")
+                if (r, c) not in self.cell_windows and workspace.get_cell(r, c) is not None:
+                    self.show_cell_window(r, c)
+        # Cells that scrolled in inside the selection
+        self.show_selection(True)
+
+        self.diagnostics_render("visible cells")
+
+    def show_cell_window(self, r, c):
+        x, y = self.cell_origin(r, c)
+        frame, item = self.widget_pool.acquire("cell_window", self.create_cell_window)
+        frame.config(highlightthickness=0)
+        self.canvas.coords(item, x, y)
+        self.canvas.itemconfigure(item, state="normal")
+        self.cell_windows[(r, c)] = (frame, item)
+
+        cell_key = f"{r}_{c}"
+        self.render_box_in_row(frame, self.data["workspace"][cell_key], cell_key)
+
+    def create_cell_window(self):
+        frame = tk.Frame(self.canvas, bg="white", bd=1, relief="solid")
+        item = self.canvas.create_window(0, 0, window=frame, anchor="nw",
+                                         width=CELL_W - 2, height=CELL_H - 2)
+        return frame, item
+
+    def release_cell_window(self, key):
+        # Hidden, not destroyed: the next cell scrolling in reuses it
+        frame, item = self.cell_windows.pop(key)
+        self.release_cell_contents(frame)
+        self.canvas.itemconfigure(item, state="hidden")
+        self.widget_pool.release("cell_window", (frame, item))
+
+    def refresh_virtual_cell(self, r, c):
+        cell = self.data["workspace"].get_cell(r, c)
+        if (r, c) in self.cell_windows:
+            if cell is None:
+                # Emptied (undo): the rectangle underneath shows again
+                self.release_cell_window((r, c))
+                return
+            frame, _ = self.cell_windows[(r, c)]
+            self.render_box_in_row(frame, cell, f"{r}_{c}")
+            return
+        rows, cols = self.visible_range()
+        if cell is not None and r in rows and c in cols:
+            self.show_cell_window(r, c)
+
+    def cell_at_pointer(self, x_root, y_root):
+        # Hit test from the pointer position and the fixed cell geometry
+        x = x_root - self.canvas.winfo_rootx()
+        y = y_root - self.canvas.winfo_rooty()
+        if not (0 <= x < self.canvas.winfo_width() and 0 <= y < self.canvas.winfo_height()):
+            return None
+        c = int((self.canvas.canvasx(x) - ROW_HEADER_W) // CELL_W)
+        r = int((self.canvas.canvasy(y) - COL_HEADER_H) // CELL_H)
+        if 0 <= r < self.max_rows and 0 <= c < self.max_cols:
+            return (r, c)
+        return None
 
     def stop_drag(self, event):
         if self.drag_data["window"]:
-            self.drag_data["window"].destroy()
+            if DRAG_PROXY == "overlay":
+                if self.drag_data["frame"] is not None:
+                    self.after_cancel(self.drag_data["frame"])
+                    self.drag_data["frame"] = None
+                self.drag_data["pending"] = None
+                self.drag_proxy.place_forget()
+                self.set_drop_preview(None)
+            else:
+                self.drag_data["window"].destroy()
             self.drag_data["window"] = None
 
             x, y = self.winfo_pointerxy()
-            widget = self.winfo_containing(x, y)
-            
-            # Find the cell frame
-            target_cell = None
-            check = widget
-            while check:
-                # Check if this widget is in our grid_cells structure
-                # A bit inefficient to search all, but robust
-                for r_idx, row in enumerate(self.grid_cells):
-                    if check in row:
-                        c_idx = row.index(check)
-                        target_cell = (r_idx, c_idx)
-                        break
-                if target_cell: break
-                
-                try:
-                    check = check.master
-                except:
-                    break
-            
+            target_cell = self.cell_under_pointer(x, y)
             if target_cell:
-                self.drop_box(target_cell[0], target_cell[1], self.drag_data["item"])
+                if self.in_selection(target_cell) and self.selection[:2] != self.selection[2:]:
+                    # Dropped onto a selected range: the box fills all of it
+                    self.apply_range_step(self.model.fill_range(*self.selection, self.drag_data["item"]))
+                else:
+                    self.drop_box(target_cell[0], target_cell[1], self.drag_data["item"])
 
-    def drop_box(self, r, c, box):
-        cell_key = f"{r}_{c}"
-        
-        # Check if this row was already used
-        row_already_used = any(k.startswith(f"{r}_") for k in self.data["workspace"])
-        # Check if this col 0 was already used (for ANY row)
-        col0_already_used = any(k.endswith("_0") for k in self.data["workspace"])
-        
-        self.data["workspace"][cell_key] = {
-            "content": box["content"],
-            "color": box["color"],
-            "values": [] 
-        }
-        
-        needs_rerender = False
+    def cell_under_pointer(self, x, y):
+        if self.virtual_grid:
+            return self.cell_at_pointer(x, y)
+
+        widget = self.winfo_containing(x, y)
         
-        # 1 satıra herhangi bir şey konulduğu anda +1 satır daha oluşacak.
-        if not row_already_used:
-            self.max_rows += 1
-            needs_rerender = True
+        # Find the cell frame: walk up to the first widget that is a cell
+        target_cell = None
+        check = widget
+        while check:
+            target_cell = self.cell_index.get(check)
+            if target_cell: break
             
-        # bir satırın ilk sütunu doluysa o satırda +1 sütun oluşacak.
-        if c == 0:
-            # Technically user said "o satırda", but for a uniform grid we expand globally
-            # If col 0 of THIS row is filled, add a column? 
-            # We'll just check if it's the first time col 0 is filled for this specific row?
-            # Or if ANY col 0 is filled? "bir satırın ilk sütunu" -> "a row's first column".
-            # I'll check if this specific row's col 0 was empty before.
-            row_col0_used = f"{r}_0" in self.data["workspace"]
-            # Wait, I just filled it. So I should have checked before.
-            # Let's say: if c == 0, we add a column.
-            self.max_cols += 1
-            needs_rerender = True
-            
-        self.save_data()
+            try:
+                check = check.master
+            except:
+                break
+        return target_cell
+
+    def cell_frame_at(self, r, c):
+        if self.virtual_grid:
+            window = self.cell_windows.get((r, c))
+            return window[0] if window else None
+        if r < len(self.grid_cells) and c < len(self.grid_cells[r]):
+            return self.grid_cells[r][c]
+        return None
+
+    def set_drop_preview(self, cell):
+        # Highlights the cell a drop would land in
+        old = self.drag_data["preview"]
+        if cell == old:
+            return
+        if old is not None:
+            self.highlight_cell(old, self.in_selection(old))
+        if cell is not None:
+            self.highlight_cell(cell, True)
+        self.drag_data["preview"] = cell
+
+    def highlight_cell(self, cell, on):
+        frame = self.cell_frame_at(*cell)
+        if frame is not None:
+            frame.config(highlightthickness=2 if on else 0, highlightbackground="blue")
+        elif self.virtual_grid and cell in self.cell_rects:
+            # Empty virtual cells are canvas rectangles
+            self.canvas.itemconfigure(self.cell_rects[cell], outline="blue" if on else "black",
+                                      width=2 if on else 1)
+
+    def drop_box(self, r, c, box):
+        cell_key = f"{r}_{c}"
+        # Growth rules (new row / new column) live in the model
+        needs_rerender = self.model.drop_box(r, c, box)
         
-        if needs_rerender:
-            self.render_grid()
+        if self.virtual_grid:
+            # Growing only changes the scroll extent; just this cell gets widgets
+            if needs_rerender:
+                self.update_scrollregion()
+                self.schedule_visible_update()
+            self.refresh_virtual_cell(r, c)
         else:
+            if needs_rerender:
+                # Only the new row / column gets built, not the whole grid
+                self.grow_grid()
             cell_frame = self.grid_cells[r][c]
             self.render_box_in_row(cell_frame, self.data["workspace"][cell_key], cell_key)
             
+    def refresh_cell(self, r, c):
+        if self.virtual_grid:
+            self.refresh_virtual_cell(r, c)
+            return
+        # Rows still waiting for an idle chunk are built from the data later
+        if r >= len(self.grid_cells) or c >= self.grid_cols:
+            return
+        cell_frame = self.grid_cells[r][c]
+        cell = self.data["workspace"].get_cell(r, c)
+        if cell is not None:
+            self.render_box_in_row(cell_frame, cell, f"{r}_{c}")
+        else:
+            self.release_cell_contents(cell_frame)
+            cell_frame.config(bg="white")
+
+    def undo(self, event=None):
+        self.show_history_step(self.model.undo(), 0)
+
+    def redo(self, event=None):
+        self.show_history_step(self.model.redo(), 1)
+
+    def show_history_step(self, step, side):
+        # Only the cells the step touched are redrawn, unless it swapped the workspace
+        if step is None:
+            return
+        if step.workspaces is not None:
+            self.render_grid()
+            return
+        if step.bounds is not None and step.bounds[0] != step.bounds[1]:
+            if self.virtual_grid:
+                self.update_scrollregion()
+                self.schedule_visible_update()
+            elif side == 1:
+                self.grow_grid()
+            else:
+                # The classic grid can only grow in place
+                self.render_grid()
+                return
+        for cell_key in step.changes:
+            self.refresh_cell(*parse_cell_key(cell_key))
+
+    # --- Range selection: Shift+click two corners ---
+
+    def on_select_click(self, event):
+        cell = self.cell_under_pointer(event.x_root, event.y_root)
+        if cell is None:
+            return
+        if self.selection_anchor is None:
+            self.selection_anchor = cell
+            self.set_selection(cell, cell)
+        else:
+            self.set_selection(self.selection_anchor, cell)
+            self.selection_anchor = None
+
+    def set_selection(self, a, b):
+        self.show_selection(False)
+        if a is None:
+            self.selection = None
+            self.selection_anchor = None
+            self.selection_label.config(text="")
+        else:
+            self.selection = (min(a[0], b[0]), min(a[1], b[1]), max(a[0], b[0]), max(a[1], b[1]))
+            self.selection_label.config(text="Seçim: %d,%d - %d,%d" % self.selection)
+        self.show_selection(True)
+
+    def show_selection(self, on):
+        if self.selection is None:
+            return
+        r0, c0, r1, c1 = self.selection
+        if self.virtual_grid:
+            # Only cells in view have anything to highlight
+            rows, cols = self.visible_range()
+            r0, r1 = max(r0, rows.start), min(r1, rows.stop - 1)
+            c0, c1 = max(c0, cols.start), min(c1, cols.stop - 1)
+        for r in range(r0, r1 + 1):
+            for c in range(c0, c1 + 1):
+                self.highlight_cell((r, c), on)
+
+    def in_selection(self, cell):
+        if self.selection is None:
+            return False
+        r0, c0, r1, c1 = self.selection
+        return r0 <= cell[0] <= r1 and c0 <= cell[1] <= c1
+
+    def clear_selection(self, event=None):
+        self.set_selection(None, None)
+
+    def copy_selection(self, event=None):
+        if self.selection is None or isinstance(getattr(event, "widget", None), tk.Entry):
+            return
+        self.range_clipboard = self.model.copy_range(*self.selection)
+
+    def paste_selection(self, event=None):
+        # Pasted with its top left corner at the selection's
+        if self.selection is None or self.range_clipboard is None:
+            return
+        if isinstance(getattr(event, "widget", None), tk.Entry):
+            return
+        self.apply_range_step(self.model.paste_range(self.selection[0], self.selection[1], self.range_clipboard))
+
+    def insert_rows(self):
+        # As many empty rows as the selection is high, above it
+        if self.selection is not None:
+            r0, _, r1, _ = self.selection
+            self.apply_range_step(self.model.insert_rows(r0, r1 - r0 + 1))
+
+    def delete_rows(self):
+        if self.selection is not None:
+            r0, _, r1, _ = self.selection
+            self.apply_range_step(self.model.delete_rows(r0, r1 - r0 + 1))
+
+    def apply_range_step(self, step):
+        # A range edit redraws the cells it changed, nothing else
+        self.show_history_step(step, 1)
+        self.show_selection(True)
+
     def create_bottom_controls(self):
         control_frame = tk.Frame(self.center_panel, bg="white")
         control_frame.pack(side="bottom", fill="x", pady=10, padx=10)
+
+        tk.Button(control_frame, text="Geri Al", command=self.undo).pack(side="left", padx=5)
+        tk.Button(control_frame, text="Yinele", command=self.redo).pack(side="left", padx=5)
+        self.bind_all("<Control-z>", self.undo)
+        self.bind_all("<Control-y>", self.redo)
+        self.bind_all("<Control-Z>", self.redo)
+        tk.Button(control_frame, text="Önizleme", command=self.toggle_preview).pack(side="left", padx=5)
+        self.preview_window = None
+
+        # Range edits on the Shift+click selection
+        self.selection = None            # (r0, c0, r1, c1)
+        self.selection_anchor = None
+        self.range_clipboard = None      # model.RangeCopy
+        tk.Button(control_frame, text="Kopyala", command=self.copy_selection).pack(side="left", padx=5)
+        tk.Button(control_frame, text="Yapıştır", command=self.paste_selection).pack(side="left", padx=5)
+        tk.Button(control_frame, text="Satır Ekle", command=self.insert_rows).pack(side="left", padx=5)
+        tk.Button(control_frame, text="Satır Sil", command=self.delete_rows).pack(side="left", padx=5)
+        self.selection_label = tk.Label(control_frame, bg="white")
+        self.selection_label.pack(side="left", padx=5)
+        self.bind_all("<Shift-Button-1>", self.on_select_click)
+        self.bind_all("<Control-c>", self.copy_selection)
+        self.bind_all("<Control-v>", self.paste_selection)
+        self.bind_all("<Escape>", self.clear_selection)
         
-        tk.Button(control_frame, text="Import", command=self.import_project).pack(side="right", padx=5)
-        tk.Button(control_frame, text="Save", command=self.save_project).pack(side="right", padx=5)
-        tk.Button(control_frame, text="Export", command=self.export_project).pack(side="right", padx=5)
+        self.file_buttons = [
+            tk.Button(control_frame, text="Import", command=self.import_project),
+            tk.Button(control_frame, text="Save", command=self.save_project),
+            tk.Button(control_frame, text="Export", command=self.export_project),
+        ]
+        for button in self.file_buttons:
+            button.pack(side="right", padx=5)
+
+        # Shown while a background import/export runs
+        self.task = None
+        self.task_frame = tk.Frame(control_frame, bg="white")
+        self.task_label = tk.Label(self.task_frame, bg="white")
+        self.task_label.pack(side="left", padx=5)
+        self.task_bar = ttk.Progressbar(self.task_frame, length=200)
+        self.task_bar.pack(side="left", padx=5)
+        self.task_cancel_btn = tk.Button(self.task_frame, text="Cancel", command=self.cancel_task)
+        self.task_cancel_btn.pack(side="left", padx=5)
 
-    def save_file(self, lines, title):
+    def run_task(self, title, work, on_done, error_text, job=None):
+        # work(task) runs on a worker thread and must only read snapshots;
+        # on_done(result) is called on the Tk thread once it has finished.
+        # job names it in the instrumentation report ("job.<name>").
+        if self.instrumentation is not None and job is not None:
+            work = self.instrumentation.timed(work, f"job.{job}")
+        self.task = BackgroundTask(work)
+        self.task_on_done = on_done
+        self.task_error_text = error_text
+        self.task_label.config(text=title)
+        # Indeterminate until the job reports how much there is to do
+        self.task_bar.config(mode="indeterminate", value=0)
+        self.task_bar.start()
+        self.task_cancel_btn.config(state="normal")
+        self.task_frame.pack(side="left")
+        for button in self.file_buttons:
+            button.config(state="disabled")
+        self.task.start()
+        self.after(TASK_POLL_MS, self.poll_task)
+
+    def poll_task(self):
+        for message in self.task.poll():
+            kind = message[0]
+            if kind == "progress":
+                done, total = message[1], message[2]
+                if str(self.task_bar.cget("mode")) != "determinate":
+                    self.task_bar.stop()
+                    self.task_bar.config(mode="determinate")
+                self.task_bar.config(maximum=max(total, 1), value=done)
+                continue
+            on_done = self.task_on_done
+            self.finish_task()
+            if kind == "done":
+                on_done(message[1])
+            elif kind == "error":
+                messagebox.showerror("Error", f"{self.task_error_text}: {message[1]}")
+            return
+        self.after(TASK_POLL_MS, self.poll_task)
+
+    def cancel_task(self):
+        # The worker stops at its next progress report, poll_task then cleans up
+        if self.task is not None:
+            self.task.cancel()
+            self.task_label.config(text="Cancelling...")
+            self.task_cancel_btn.config(state="disabled")
+
+    def finish_task(self):
+        self.task = None
+        self.task_on_done = None
+        self.task_bar.stop()
+        self.task_frame.pack_forget()
+        for button in self.file_buttons:
+            button.config(state="normal")
+
+    # --- Live export preview ---
+
+    def toggle_preview(self):
+        if self.preview_window is not None:
+            self.close_preview()
+            return
+        window = tk.Toplevel(self)
+        window.title("Export Preview")
+        text = tk.Text(window, width=100, height=30, wrap="none")
+        text.pack(fill="both", expand=True)
+        window.protocol("WM_DELETE_WINDOW", self.close_preview)
+        self.preview_window = window
+        self.preview_text = text
+        self.update_preview(full=True)
+
+    def close_preview(self):
+        self.after_cancel(self.preview_refresh)
+        self.preview_window.destroy()
+        self.preview_window = None
+
+    def update_preview(self, full=False):
+        # Polls the export cache: only rows edited since the last pass are
+        # re-rendered and replaced in the Text widget
+        changed_all, rows = self.model.export_cache.take_changes()
+        text = self.preview_text
+        if full or changed_all:
+            text.delete("1.0", "end")
+            buffer = io.StringIO()
+            self.model.export_to(buffer)
+            text.insert("1.0", buffer.getvalue())
+        elif rows:
+            # Export line r is text line r + 1; keep exactly max_row + 1 lines
+            line_count = max(1, self.data["workspace"].max_row + 1)
+            have = int(text.index("end-1c").split(".")[0])
+            if have < line_count:
+                text.insert("end-1c", "\n" * (line_count - have))
+            elif have > line_count:
+                text.delete(f"{line_count}.end", "end-1c")
+            for r in sorted(rows):
+                if r < line_count:
+                    text.delete(f"{r + 1}.0", f"{r + 1}.end")
+                    text.insert(f"{r + 1}.0", self.model.row_text(r))
+        self.preview_refresh = self.after(PREVIEW_REFRESH_MS, self.update_preview)
+
+    def save_file(self, start, title):
+        # start() runs on the Tk thread once a file is picked and returns
+        # (write, on_saved): write(f, progress) streams the content into the
+        # file on a worker thread; on_saved() (or None) runs on the Tk thread
+        # after a successful write
         from tkinter import filedialog
         filepath = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text Files", "*.txt")], title=title)
         if filepath:
-            try:
-                with open(filepath, "w", encoding="utf-8") as f:
-                    f.write("\n".join(lines))
+            write, on_saved = start()
+
+            def done(result):
+                if on_saved is not None:
+                    on_saved()
                 messagebox.showinfo("Success", f"File saved: {filepath}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Could not save file: {e}")
+
+            self.run_task("Saving...",
+                          lambda task: atomic_write(filepath, lambda f: write(f, task.progress)),
+                          done, "Could not save file", job="export")
 
     def start_drag(self, event, box):
         self.drag_data["item"] = box
         self.drag_data["x"] = event.x
         self.drag_data["y"] = event.y
+
+        if DRAG_PROXY == "overlay":
+            # One label, reused for every drag, placed over the main window
+            if self.drag_proxy is None:
+                self.drag_proxy = tk.Label(self, bd=1, relief="solid")
+            self.drag_proxy.config(text=box["content"], bg=box["color"])
+            self.drag_data["window"] = self.drag_proxy
+            self.drag_stats.drags += 1
+            self.place_drag_proxy(event.x_root, event.y_root)
+            return
         
         # Create a top-level window as the drag object
         self.drag_data["window"] = tk.Toplevel(self)
@@ -354,44 +1076,208 @@ class App(tk.Tk):
         lbl.pack()
 
     def drag_motion(self, event):
-        if self.drag_data["window"]:
+        if not self.drag_data["window"]:
+            return
+        if DRAG_PROXY != "overlay":
             x = event.x_root - self.drag_data["x"]
             y = event.y_root - self.drag_data["y"]
             self.drag_data["window"].geometry(f"+{x}+{y}")
+            return
+
+        # Motion events between two frames collapse into the latest position;
+        # latency is counted from the first event the update covers
+        pending = self.drag_data["pending"]
+        first_seen = pending[2] if pending else time.perf_counter()
+        self.drag_data["pending"] = (event.x_root, event.y_root, first_seen)
+        self.drag_stats.events += 1
+        if self.drag_data["frame"] is None:
+            self.drag_data["frame"] = self.after(DRAG_FRAME_MS, self.apply_drag_motion)
+
+    def apply_drag_motion(self):
+        self.drag_data["frame"] = None
+        pending = self.drag_data["pending"]
+        if not pending or not self.drag_data["window"]:
+            return
+        self.drag_data["pending"] = None
+        x_root, y_root, first_seen = pending
+        self.place_drag_proxy(x_root, y_root)
+        self.set_drop_preview(self.cell_under_pointer(x_root, y_root))
+        self.drag_stats.record((time.perf_counter() - first_seen) * 1000)
+
+    def place_drag_proxy(self, x_root, y_root):
+        # place() inside our own window: no window manager round trip
+        self.drag_proxy.place(x=x_root - self.winfo_rootx() + DRAG_PROXY_OFFSET,
+                              y=y_root - self.winfo_rooty() + DRAG_PROXY_OFFSET)
+        self.drag_proxy.lift()
 
     def update_row_value(self, cell_key, value_idx, new_value):
-        # cell_key is now "r_c"
-        if cell_key in self.data["workspace"]:
-             while len(self.data["workspace"][cell_key]["values"]) <= value_idx:
-                self.data["workspace"][cell_key]["values"].append("")
-             self.data["workspace"][cell_key]["values"][value_idx] = new_value
-             self.save_data()
+        self.model.update_row_value(cell_key, value_idx, new_value)
+
+    # --- Cell editors (pooled) ---
+
+    def create_editor(self, kind):
+        # Editors are children of the grid container and packed into a cell
+        # frame with in_, so the same widget can later move to another cell.
+        parent = self.cell_parent
+        if kind == "static":
+            return CellEditor(kind, tk.Label(parent))
+
+        if kind == "color":
+            editor = CellEditor(kind, tk.Button(parent, text="Color", width=6))
+            editor.widget.config(command=lambda: self.pick_editor_color(editor))
+            return editor
+
+        if kind.startswith("select:"):
+            # "select" creates a checkbox for each option. If checked, it enables input.
+            frame = tk.Frame(parent)
+            input_var = tk.StringVar()
+            entry = self.create_value_entry(frame, kind[7:], input_var, width=5)
+            entry.pack(side="right")
+            editor = CellEditor(kind, frame, input_var, tk.IntVar(value=0), entry)
+            editor.check = tk.Checkbutton(frame, variable=editor.check_var,
+                                          command=lambda: self.toggle_editor_check(editor))
+            editor.check.pack(side="left")
+        else:
+            var = tk.StringVar()
+            width = 10 if kind == "entry" else 8
+            editor = CellEditor(kind, self.create_value_entry(parent, kind, var, width), var)
+
+        # One trace per editor for its whole life; it writes to whatever slot the editor is bound to
+        editor.trace_id = editor.var.trace_add("write", lambda *args: self.on_editor_change(editor))
+        self.live_traces += 1
+        return editor
+
+    def discard_pooled(self, kind, item):
+        # Pool is full: tear the widget down for good, trace included
+        if kind == "cell_window":
+            frame, window_item = item
+            self.canvas.delete(window_item)
+            frame.destroy()
+            return
+        if isinstance(item, CellEditor):
+            if item.trace_id is not None:
+                item.var.trace_remove("write", item.trace_id)
+                item.trace_id = None
+                self.live_traces -= 1
+            item.widget.destroy()
+            return
+        item.destroy()
+
+    def create_value_entry(self, parent, kind, var, width):
+        # Supports .i0i., .s0s., or plain text
+        if kind == "int":
+            entry = tk.Entry(parent, textvariable=var, width=width, validate="key", validatecommand=self.vcmd_int)
+        elif kind == "symbol":
+            entry = tk.Entry(parent, textvariable=var, width=width, validate="key", validatecommand=self.vcmd_sym)
+        else:
+            entry = tk.Entry(parent, textvariable=var, width=width)
+        # Leaving the field closes its undo step; coming back starts a new one
+        entry.bind("<FocusOut>", lambda event: self.model.end_edit())
+        return entry
+
+    def bind_editor(self, editor, cell_key, idx, value, color, label=None):
+        # Unbound while its variables are set, so the trace doesn't save them back
+        editor.cell_key = None
+        if editor.kind == "static":
+            editor.widget.config(text=label, bg=color)
+        elif editor.kind == "color":
+            editor.widget.config(bg=value or "#000000") # Default
+        elif editor.kind.startswith("select:"):
+            # Saved value format: "ENABLED|VALUE"
+            is_enabled_str, saved_val = split_select_value(value)
+            is_enabled = (is_enabled_str == "1")
+            editor.check_var.set(1 if is_enabled else 0)
+            editor.var.set(saved_val)
+            editor.entry.config(state="normal" if is_enabled else "disabled")
+            editor.widget.config(bg=color)
+            editor.check.config(text=label, bg=color)
+        else:
+            editor.var.set(value)
+        editor.cell_key = cell_key
+        editor.idx = idx
+
+    def on_editor_change(self, editor):
+        if editor.cell_key is None:
+            return
+        if editor.kind.startswith("select:"):
+            self.update_row_value(editor.cell_key, editor.idx, f"{editor.check_var.get()}|{editor.var.get()}")
+        else:
+            self.update_row_value(editor.cell_key, editor.idx, editor.var.get())
+
+    def toggle_editor_check(self, editor):
+        state = editor.check_var.get()
+        editor.entry.config(state="normal" if state else "disabled")
+        if editor.cell_key is not None:
+            # Save: "1|value" or "0|value"
+            self.update_row_value(editor.cell_key, editor.idx, f"{state}|{editor.var.get()}")
+
+    def pick_editor_color(self, editor):
+        color = colorchooser.askcolor()[1]
+        if color:
+            editor.widget.config(bg=color)
+            if editor.cell_key is not None:
+                self.update_row_value(editor.cell_key, editor.idx, color)
+
+    def release_cell_contents(self, parent):
+        # Editors shown in this cell go back to the pool
+        for editor in self.cell_editors.pop(parent, ()):
+            editor.cell_key = None
+            editor.widget.pack_forget()
+            self.widget_pool.release(editor.kind, editor)
+
+    def count_tcl_commands(self):
+        return len(self.tk.splitlist(self.tk.call("info", "commands")))
+
+    def show_diagnostics(self):
+        # Live Tcl commands, traced variables and tracemalloc deltas between renders
+        if self.diagnostics_window is not None:
+            self.diagnostics_window.lift()
+            return
+        self.diagnostics.start()
+        window = tk.Toplevel(self)
+        window.title("Diagnostics")
+        text = tk.Text(window, width=100, height=30)
+        text.pack(fill="both", expand=True)
+        tk.Button(window, text="Refresh", command=lambda: self.diagnostics_render("manual")).pack(pady=5)
+        window.protocol("WM_DELETE_WINDOW", self.close_diagnostics)
+        self.diagnostics_window = window
+        self.diagnostics_text = text
+        self.update_diagnostics_view()
+
+    def close_diagnostics(self):
+        self.diagnostics.stop()
+        self.diagnostics_window.destroy()
+        self.diagnostics_window = None
+
+    def diagnostics_render(self, label):
+        if self.diagnostics.on_render(label) is not None:
+            self.update_diagnostics_view()
+
+    def update_diagnostics_view(self):
+        pool_lines = [f"  {kind}: {s['hits']} hits, {s['misses']} misses, {s['free']} free"
+                      for kind, s in self.widget_pool.stats().items()]
+        text = (format_report(self.diagnostics.last_report) + "\n\n" + format_latency(self.drag_stats.summary())
+                + "\n\nWidget pool:\n" + "\n".join(pool_lines))
+        self.diagnostics_text.delete("1.0", "end")
+        self.diagnostics_text.insert("end", text)
+
+    def show_pool_stats(self):
+        lines = [f"{kind}: {s['hits']} hits, {s['misses']} misses, {s['free']} free"
+                 for kind, s in self.widget_pool.stats().items()]
+        messagebox.showinfo("Widget Pool", "\n".join(lines) or "Empty")
 
     def render_box_in_row(self, parent, box_data, row_idx):
-        # Clear existing
-        for w in parent.winfo_children():
-            w.destroy()
+        # Previous editors of this cell are recycled, not destroyed
+        self.release_cell_contents(parent)
             
-        parent.config(bg=box_data["color"])
-        
-        import re
-        content = box_data["content"]
-        # Regex to capture all placeholders: ..0.., .c0c., .i0i., .s0s., .select:key=val
-        # Note: .select is complex, let's treat it carefully.
-        # We'll split by a regex that captures the tokens.
-        
-        # Combined pattern
-        # 1. ..0.. -> standard
-        # 2. .c0c. -> color
-        # 3. .i0i. -> int
-        # 4. .s0s. -> symbol
-        # 5. .select:...? -> optional
+        color = box_data.color
+        parent.config(bg=color)
         
-        pattern = r"(\.\.0\.\.|\.c0c\.|\.i0i\.|\.s0s\.|\.select:[^,]+(?:,[^,]+)*)"
+        # Placeholders: ..0.., .c0c., .i0i., .s0s., .select:key=val
+        # The content is parsed once and cached, see templates.compile_template
+        template = compile_template(box_data.content)
         
-        parts = re.split(pattern, content)
-        
-        saved_values = box_data.get("values", [])
+        saved_values = box_data.values
         
         # Helper to safely get/set values
         def get_value(idx, default=""):
@@ -399,208 +1285,48 @@ class App(tk.Tk):
                 return saved_values[idx]
             return default
 
-        value_counter = 0
+        editors = []
 
-        for part in parts:
-            if not part: continue
-            
-            if part == "..0..":
-                current_idx = value_counter
-                val_var = tk.StringVar(value=get_value(current_idx))
-                entry = tk.Entry(parent, textvariable=val_var, width=10)
-                entry.pack(side="left", padx=2)
-                
-                def save_entry(var=val_var, idx=current_idx):
-                    self.update_row_value(row_idx, idx, var.get())
-                val_var.trace_add("write", lambda *args, v=val_var, i=current_idx: save_entry())
-                value_counter += 1
-                
-            elif part == ".c0c.":
-                current_idx = value_counter
-                initial_color = get_value(current_idx) or "#000000" # Default
-                
-                btn = tk.Button(parent, text="Color", bg=initial_color, width=6)
-                btn.pack(side="left", padx=2)
-                
-                def pick_col(b=btn, idx=current_idx):
-                    color = colorchooser.askcolor()[1]
-                    if color:
-                        b.config(bg=color)
-                        self.update_row_value(row_idx, idx, color)
-                
-                btn.config(command=pick_col)
-                value_counter += 1
+        def place(kind, idx, value, label=None, padx=2):
+            editor = self.widget_pool.acquire(kind, lambda: self.create_editor(kind))
+            self.bind_editor(editor, row_idx, idx, value, color, label)
+            editor.widget.pack(in_=parent, side="left", padx=padx)
+            # Created before this frame maybe; keep it above the frame in stacking order
+            editor.widget.lift(parent)
+            editors.append(editor)
 
-            elif part == ".i0i.":
-                current_idx = value_counter
-                val_var = tk.StringVar(value=get_value(current_idx))
-                
-                def validate_int(P):
-                    if P == "" or P == "-": return True
-                    return P.isdigit() or (P.startswith("-") and P[1:].isdigit())
-                
-                vcmd = (self.register(validate_int), '%P')
-                entry = tk.Entry(parent, textvariable=val_var, width=8, validate="key", validatecommand=vcmd)
-                entry.pack(side="left", padx=2)
-                
-                def save_int(var=val_var, idx=current_idx):
-                    self.update_row_value(row_idx, idx, var.get())
-                val_var.trace_add("write", lambda *args, v=val_var, i=current_idx: save_int())
-                value_counter += 1
+        value_counter = 0
 
-            elif part == ".s0s.":
-                current_idx = value_counter
-                val_var = tk.StringVar(value=get_value(current_idx))
-                
-                # Symbols only: Not alphanumeric (allow spaces? user said symbols only)
-                def validate_sym(P):
-                    for char in P:
-                        if char.isalnum(): return False
-                    return True
-                
-                vcmd = (self.register(validate_sym), '%P')
-                entry = tk.Entry(parent, textvariable=val_var, width=8, validate="key", validatecommand=vcmd)
-                entry.pack(side="left", padx=2)
-                
-                def save_sym(var=val_var, idx=current_idx):
-                    self.update_row_value(row_idx, idx, var.get())
-                val_var.trace_add("write", lambda *args, v=val_var, i=current_idx: save_sym())
-                value_counter += 1
+        for token in template.tokens:
+            if token.kind == "static":
+                place("static", None, None, token.text, padx=0)
 
-            elif part.startswith(".select:"):
+            elif token.kind == "select":
                 # Format: .select:label=.i0i.,label2=fixed
-                # We need to parse inside the select
-                # Stripping .select:
-                options_str = part[8:]
-                options = options_str.split(',') # Comma select
-                
-                # Each value in values list for select will be complex? 
-                # Or just treat each option as a value index?
-                # Simplify: "select" creates a checkbox for each option. 
-                # If checked, it enables input. 
-                # Format: "key=value_template"
-                
-                for opt in options:
-                    if "=" not in opt: continue
-                    label, template = opt.split("=", 1)
-                    
-                    current_idx = value_counter
-                    
-                    # Saved value format: "ENABLED|VALUE" or just "VALUE" (if enabled)
-                    # Let's verify how to store. 
-                    # If export needs "key=value", we store "value" if checked, else empty?
-                    
-                    saved_raw = get_value(current_idx, "0|") # Default disabled
-                    try:
-                        is_enabled_str, saved_val = saved_raw.split("|", 1)
-                        is_enabled = (is_enabled_str == "1")
-                    except:
-                        is_enabled = False
-                        saved_val = ""
-
-                    frame = tk.Frame(parent, bg=box_data["color"])
-                    frame.pack(side="left", padx=2)
-                    
-                    chk_var = tk.IntVar(value=1 if is_enabled else 0)
-                    
-                    # Create input widget based on template
-                    # Supports .i0i., .s0s., or plain text
-                    input_var = tk.StringVar(value=saved_val)
-                    widget = None
-
-                    if template == ".i0i.":
-                         vcmd = (self.register(lambda P: P == "" or P == "-" or P.isdigit() or (P.startswith("-") and P[1:].isdigit())), '%P')
-                         widget = tk.Entry(frame, textvariable=input_var, width=5, validate="key", validatecommand=vcmd)
-                    elif template == ".s0s.":
-                         vcmd = (self.register(lambda P: all(not c.isalnum() for c in P)), '%P')
-                         widget = tk.Entry(frame, textvariable=input_var, width=5, validate="key", validatecommand=vcmd)
-                    else:
-                         # Default entry or fixed? If fixed (e.g. key=5), just label?
-                         # User said: ".select:"row=.i0i.","."column=.i0i."" -> export "...row=girilensayı..."
-                         # So it's key=Input.
-                         widget = tk.Entry(frame, textvariable=input_var, width=5)
-
-                    widget.pack(side="right")
-                    widget.config(state="normal" if is_enabled else "disabled")
-                    
-                    def toggle_check(w=widget, cv=chk_var, iv=input_var, idx=current_idx):
-                        state = cv.get()
-                        if state:
-                            w.config(state="normal")
-                        else:
-                            w.config(state="disabled")
-                        # Save: "1|value" or "0|value"
-                        val_to_save = f"{state}|{iv.get()}"
-                        self.update_row_value(row_idx, idx, val_to_save)
-                    
-                    chk = tk.Checkbutton(frame, text=label, variable=chk_var, command=lambda: toggle_check(), bg=box_data["color"])
-                    chk.pack(side="left")
-                    
-                    # Trace input change too
-                    def save_opt(cv=chk_var, iv=input_var, idx=current_idx):
-                         self.update_row_value(row_idx, idx, f"{cv.get()}|{iv.get()}")
-                    
-                    input_var.trace_add("write", lambda *args: save_opt())
-                    
+                for opt in token.options:
+                    place("select:" + opt.kind, value_counter, get_value(value_counter, "0|"), opt.label)
                     value_counter += 1
 
             else:
-                # Static text
-                tk.Label(parent, text=part, bg=box_data["color"]).pack(side="left")
+                # entry, color, int, symbol
+                place(token.kind, value_counter, get_value(value_counter))
+                value_counter += 1
+
+        self.cell_editors[parent] = editors
 
 
     def export_project(self):
-        lines = []
-        for r in range(self.max_rows):
-            row_text = ""
-            for c in range(self.max_cols):
-                cell_key = f"{r}_{c}"
-                if cell_key in self.data["workspace"]:
-                    item = self.data["workspace"][cell_key]
-                    content = item["content"]
-                    values = item["values"]
-                    
-                    import re
-                    pattern = r"(\.\.0\.\.|\.c0c\.|\.i0i\.|\.s0s\.|\.select:[^,]+(?:,[^,]+)*)"
-                    parts = re.split(pattern, content)
-                    
-                    result = ""
-                    value_idx = 0
-                    
-                    for part in parts:
-                        if not part: continue
-                        
-                        if part in ["..0..", ".c0c.", ".i0i.", ".s0s."]:
-                            val = values[value_idx] if value_idx < len(values) else ""
-                            result += str(val)
-                            value_idx += 1
-                            
-                        elif part.startswith(".select:"):
-                            options = part[8:].split(',')
-                            for opt in options:
-                                if "=" not in opt: continue
-                                label, tmpl = opt.split("=", 1)
-                                
-                                raw_val = values[value_idx] if value_idx < len(values) else "0|"
-                                try:
-                                    enabled, val = raw_val.split("|", 1)
-                                except:
-                                    enabled, val = "0", ""
-                                    
-                                if enabled == "1":
-                                    result += f"{label}={val} "
-                                
-                                value_idx += 1
-                        else:
-                            result += part
-                    
-                    row_text += result
-                else:
-                    pass 
-            
-            lines.append(row_text.rstrip())
-        
-        self.save_file(lines, "Exported Text")
+        # Only occupied cells are visited; lines go straight to the file.
+        # Rows unchanged since the last export (or preview) come from the row
+        # cache; the worker renders the rest and the cache keeps them afterwards.
+        # The plan is made once a file is picked: it may pin chunk files.
+        def start():
+            plan = self.model.export_plan()
+            if self.instrumentation is not None:
+                self.instrumentation.attach(plan, PLAN_HOOKS, "ExportPlan")
+            return plan.write, lambda: self.model.export_cache.store(plan)
+
+        self.save_file(start, "Exported Text")
 
     def save_project(self):
         # Save: Keep structure using custom markers
@@ -622,48 +1348,58 @@ class App(tk.Tk):
         # However, to respect the previous "human readable" request:
         # We can iterate rows. But cells?
         # Let's just dump the self.data["workspace"] into the file as JSON.
-        
-        import json
-        self.save_file([json.dumps(self.data["workspace"], indent=2)], "Project Data")
+        # Large projects can use the binary .kkp format or a chunked .kkc directory instead.
+        from tkinter import filedialog
+        filepath = filedialog.asksaveasfilename(defaultextension=".txt", title="Project Data",
+                                                filetypes=[("Text Files", "*.txt"), ("JSON Files", "*.json"),
+                                                           ("Binary Project", "*" + BINARY_EXTENSION),
+                                                           ("Chunked Project", "*" + CHUNKED_EXTENSION)])
+        if filepath:
+            snapshot = self.model.snapshot()
+
+            def work(task):
+                try:
+                    self.model.save_project_file(filepath, snapshot, task.progress)
+                finally:
+                    # Pinned chunk files, if any
+                    snapshot.close()
+
+            self.run_task("Saving...", work,
+                          lambda result: messagebox.showinfo("Success", f"File saved: {filepath}"),
+                          "Could not save file", job="save")
         
     def import_project(self):
         from tkinter import filedialog
-        import json
         
-        filepath = filedialog.askopenfilename(filetypes=[("Text Files", "*.txt"), ("JSON Files", "*.json")])
+        filepath = filedialog.askopenfilename(filetypes=[("Text Files", "*.txt"), ("JSON Files", "*.json"),
+                                                         ("Binary Project", "*" + BINARY_EXTENSION),
+                                                         ("Chunked Project", CHUNKED_MANIFEST)])
         if not filepath:
             return
             
-        try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                content = f.read()
-                
-            # Try to parse as JSON first (new save format)
-            new_workspace = json.loads(content)
-            
-            # Basic validation
-            if isinstance(new_workspace, dict):
-                self.data["workspace"] = new_workspace
-                self.save_data()
-                
-                # Re-calc max dimensions
-                self.max_rows = 10
-                self.max_cols = 10
-                for key in self.data["workspace"].keys():
-                    try:
-                        r, c = map(int, key.split("_"))
-                        if r >= self.max_rows: self.max_rows = r + 1
-                        if c >= self.max_cols: self.max_cols = c + 1
-                    except:
-                        pass
-                
-                self.render_grid()
-                messagebox.showinfo("Success", "Project imported successfully.")
-                return
+        # JSON, binary or chunked project written by Save.
+        # Text written by Export is matched back into cells against the palette's boxes.
+        # Reading and parsing happen on the worker, self.data changes only when it is done.
+        # Chunked and big projects land in a fresh chunk store, named here on the Tk thread.
+        chunk_dir = self.model.new_chunk_dir()
+        boxes = self.model.template_boxes()
+
+        def work(task):
+            workspace = self.model.read_project(filepath, chunk_dir, boxes, task.progress)
+            task.check()
+            return workspace
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to import: {e}")
+        self.run_task("Importing...", work, self.apply_import, "Failed to import", job="import")
+
+    def apply_import(self, workspace):
+        self.model.import_workspace(workspace)
+        self.render_grid()
+        messagebox.showinfo("Success", "Project imported successfully.")
 
 if __name__ == "__main__":
-    app = App()
+    instrumentation = None
+    for arg in sys.argv[1:]:
+        if arg == "--instrument" or arg.startswith("--instrument="):
+            instrumentation = Instrumentation(arg.partition("=")[2] or DEFAULT_DUMP_PATH)
+    app = App(profile_startup="--profile-startup" in sys.argv[1:], instrumentation=instrumentation)
     app.mainloop()
\ No newline at end of file
@@ -0,0 +1,86 @@
+import glob
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from binproject import EXTENSION as BINARY_EXTENSION
+from chunkstore import EXTENSION as CHUNKED_EXTENSION, is_chunked_project
+from exporter import export_to_file, read_workspace
+from persistence import atomic_write
+from workspace import LazyRowWorkspace
+
+# Batch export of many saved projects across a process pool. Template
+# expansion is pure Python, so one process per core is what scales; each
+# worker reads, exports and writes one file and only sends back a Result.
+
+# Files (and chunked project directories) picked up when a directory is given
+PROJECT_EXTENSIONS = (".json", ".txt", BINARY_EXTENSION, CHUNKED_EXTENSION)
+# Appended to the project name; projects saved as .txt must not be overwritten
+DEFAULT_SUFFIX = ".export.txt"
+
+Result = namedtuple("Result", "project output ok error cells seconds")
+
+
+def find_projects(patterns, suffix=DEFAULT_SUFFIX):
+    # Directories, files and glob patterns -> sorted unique project paths.
+    # Earlier batch outputs (ending in suffix) are skipped.
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern) and not is_chunked_project(pattern):
+            paths = [os.path.join(pattern, name) for name in os.listdir(pattern)
+                     if name.lower().endswith(PROJECT_EXTENSIONS)]
+        else:
+            paths = glob.glob(pattern) or [pattern]
+        for path in paths:
+            if not path.endswith(suffix):
+                found.add(os.path.normpath(path))
+    return sorted(found)
+
+
+def output_path(project, out_dir=None, suffix=DEFAULT_SUFFIX):
+    stem = os.path.splitext(os.path.basename(project))[0]
+    return os.path.join(out_dir or os.path.dirname(project), stem + suffix)
+
+
+def convert_one(project, output):
+    # Runs in a worker process; errors come back in the Result instead of raising.
+    # Any error: a malformed project (missing keys, bad template ids, a truncated
+    # .kkp) must not take the rest of the batch down with it.
+    start = time.perf_counter()
+    try:
+        workspace = read_workspace(project)
+        try:
+            atomic_write(output, lambda f: export_to_file(workspace, f))
+        finally:
+            if isinstance(workspace, LazyRowWorkspace):
+                workspace.close()
+    except Exception as e:
+        return Result(project, output, False, f"{type(e).__name__}: {e}", 0, time.perf_counter() - start)
+    return Result(project, output, True, None, len(workspace), time.perf_counter() - start)
+
+
+def run_batch(projects, out_dir=None, suffix=DEFAULT_SUFFIX, jobs=None):
+    # Yields a Result per project as they finish (not in input order)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    jobs = jobs or os.cpu_count() or 1
+    pairs = [(project, output_path(project, out_dir, suffix)) for project in projects]
+    if jobs == 1 or len(pairs) <= 1:
+        for project, output in pairs:
+            yield convert_one(project, output)
+        return
+    with ProcessPoolExecutor(max_workers=min(jobs, len(pairs))) as pool:
+        futures = [pool.submit(convert_one, project, output) for project, output in pairs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def summarize(results, seconds, jobs):
+    ok = [r for r in results if r.ok]
+    cells = sum(r.cells for r in ok)
+    rate = len(ok) / seconds if seconds else 0.0
+    cell_rate = cells / seconds if seconds else 0.0
+    return (f"{len(ok)}/{len(results)} files exported, {len(results) - len(ok)} failed, "
+            f"{cells} cells in {seconds:.2f} s with {jobs} workers "
+            f"({rate:.1f} files/s, {cell_rate:.0f} cells/s)")
@@ -0,0 +1,216 @@
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from exporter import export_to_file
+from model import WorkspaceModel
+from templates import compile_template
+from workspace import project_to_json
+
+# Headless timings for the hot paths of the workspace model.
+#   python bench.py                      # 1k, 10k and 100k cells
+#   python bench.py --sizes 1000 --json bench_output.json
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+# Drops and keystrokes measured against each workspace size
+EDIT_OPS = 1000
+GRID_COLS = 10
+
+
+def load_boxes(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    boxes = [box for category in data["categories"] for box in category["boxes"]]
+    if not boxes:
+        raise SystemExit(f"{path}: no box templates to build workspaces from")
+    return data["categories"], boxes
+
+
+def sample_values(content, rng):
+    values = []
+    for token in compile_template(content).tokens:
+        if token.kind == "select":
+            values.extend(f"{rng.randint(0, 1)}|{rng.randint(0, 99)}" for _ in token.options)
+        elif token.kind == "int":
+            values.append(str(rng.randint(0, 999)))
+        elif token.kind == "color":
+            values.append("#%06x" % rng.randint(0, 0xFFFFFF))
+        elif token.kind == "symbol":
+            values.append(rng.choice("+-*/=<>"))
+        elif token.kind == "entry":
+            values.append(f"v{rng.randint(0, 9999)}")
+    return values
+
+
+def build_workspace(boxes, n_cells, seed=0):
+    # n_cells filled cells, GRID_COLS per row, random templates and values
+    rng = random.Random(seed)
+    workspace = {}
+    for i in range(n_cells):
+        box = rng.choice(boxes)
+        workspace[f"{i // GRID_COLS}_{i % GRID_COLS}"] = {
+            "content": box["content"],
+            "color": box["color"],
+            "values": sample_values(box["content"], rng),
+        }
+    return workspace
+
+
+def measure(fn):
+    # Wall time of a plain run, then peak traced memory of a second run
+    setup = getattr(fn, "setup", None)
+    arg = setup() if setup else None
+    start = time.perf_counter()
+    fn(arg)
+    elapsed = time.perf_counter() - start
+
+    arg = setup() if setup else None
+    tracemalloc.start()
+    fn(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def bench_size(categories, boxes, n_cells, workdir):
+    # Models run in live/, which every run gets back as a clean copy of state/
+    state_dir = os.path.join(workdir, "state")
+    live_dir = os.path.join(workdir, "live")
+    os.makedirs(state_dir)
+    data_file = os.path.join(live_dir, "app_data.json")
+    project_file = os.path.join(workdir, "project.json")
+    text_file = os.path.join(workdir, "project.txt")
+    save_file = os.path.join(workdir, "saved.json")
+    workspace = build_workspace(boxes, n_cells)
+    # Files as the app writes them: the template table and compact cells
+    with open(os.path.join(state_dir, "app_data.json"), "w", encoding="utf-8") as f:
+        json.dump(dict(project_to_json(workspace), categories=categories), f)
+    with open(project_file, "w", encoding="utf-8") as f:
+        json.dump(project_to_json(workspace), f)
+    with open(text_file, "w", encoding="utf-8") as f:
+        export_to_file(workspace, f)
+
+    def reset():
+        # Journal, chunk stores and app_data.json as they were before the first run
+        shutil.rmtree(live_dir, ignore_errors=True)
+        shutil.copytree(state_dir, live_dir)
+
+    def fresh_model():
+        reset()
+        return WorkspaceModel(data_file)
+
+    # The first load is the app's own one-time setup (a big workspace moves into
+    # a chunk store); what it leaves behind is the state every run starts from
+    reset()
+    WorkspaceModel(data_file).close()
+    shutil.rmtree(state_dir)
+    shutil.copytree(live_dir, state_dir)
+
+    rng = random.Random(1)
+    rows = n_cells // GRID_COLS + 1
+
+    def op_load(_):
+        WorkspaceModel(data_file)
+    op_load.setup = reset
+
+    def op_drop(model):
+        # Drops into existing rows and into new rows below the data
+        for i in range(EDIT_OPS):
+            r = rng.randrange(rows + EDIT_OPS)
+            model.drop_box(r, rng.randrange(GRID_COLS), rng.choice(boxes))
+        model.flush()
+    op_drop.setup = fresh_model
+
+    def op_fill(model):
+        # The same number of cells as op_drop, as range edits: one transaction each
+        for i in range(EDIT_OPS // 100):
+            r = rng.randrange(rows)
+            model.fill_range(r, 0, r + 9, GRID_COLS - 1, rng.choice(boxes))
+        model.flush()
+    op_fill.setup = fresh_model
+
+    def op_edit(model):
+        # Keystrokes into one value slot of a few cells, then one flush
+        keys = rng.sample(list(model.workspace), min(10, len(model.workspace)))
+        for i in range(EDIT_OPS):
+            key = keys[i % len(keys)]
+            model.update_row_value(key, 0, "x" * (i % 20))
+        model.flush()
+    op_edit.setup = fresh_model
+
+    def op_export(model):
+        model.export_to(io.StringIO())
+    op_export.setup = fresh_model
+
+    def exported_model():
+        model = fresh_model()
+        model.export_to(io.StringIO())
+        return model
+
+    def op_reexport(model):
+        # One value changed since the last export: only its row is rendered again
+        model.update_row_value(next(iter(model.workspace)), 0, "changed")
+        model.export_to(io.StringIO())
+    op_reexport.setup = exported_model
+
+    def op_parse(model):
+        # The export text matched back into cells against every box template
+        model.read_project(text_file)
+    op_parse.setup = fresh_model
+
+    def op_save(model):
+        # "Save" of the whole workspace as a JSON project
+        model.save_project_file(save_file)
+    op_save.setup = fresh_model
+
+    def op_import(model):
+        model.import_file(project_file)
+        model.flush()
+    op_import.setup = fresh_model
+
+    results = {}
+    for name, fn in (("load", op_load), ("drop", op_drop), ("fill", op_fill), ("edit", op_edit),
+                     ("export", op_export), ("reexport", op_reexport), ("parse", op_parse),
+                     ("save", op_save), ("import", op_import)):
+        elapsed, peak = measure(fn)
+        results[name] = {"seconds": elapsed, "peak_bytes": peak}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the headless workspace model")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="workspace sizes in cells")
+    parser.add_argument("--data", default="app_data.json", help="where the box templates come from")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    categories, boxes = load_boxes(args.data)
+    report = {}
+    print(f"{'cells':>8} {'operation':<8} {'time (ms)':>12} {'peak (KiB)':>12}")
+    for n_cells in args.sizes:
+        workdir = tempfile.mkdtemp(prefix="kutu-bench-")
+        try:
+            results = bench_size(categories, boxes, n_cells, workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        report[n_cells] = results
+        for name, res in results.items():
+            print(f"{n_cells:>8} {name:<8} {res['seconds'] * 1000:>12.1f} {res['peak_bytes'] / 1024:>12.0f}")
+        sys.stdout.flush()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
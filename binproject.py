@@ -0,0 +1,160 @@
+import json
+import mmap
+import struct
+
+from cells import Cell, intern_template
+from persistence import atomic_write
+from workspace import LazyRowWorkspace, SparseWorkspace
+
+# Binary project file (.kkp), an alternative to the JSON written by Save.
+#
+#   header     magic, version, row/cell/template counts, max column,
+#              offsets of the template table and of the row table
+#   rows       one record per occupied row:
+#                u32 cell count, then per cell: i32 column, u32 template id,
+#                u32 value count, then per value: u8 kind, u32 length, bytes
+#   templates  interned (content, color) pairs: u32 length + utf-8, twice
+#   row table  (i32 row, u64 record offset) per row, sorted by row
+#
+# Rows are written first so the file is produced in one pass; the header is
+# patched at the end. The reader maps the file and decodes a row only when
+# it is asked for.
+
+MAGIC = b"KKPJ"
+VERSION = 1
+EXTENSION = ".kkp"
+
+HEADER = struct.Struct("<4sHHIIIiQQ")
+ROW_ENTRY = struct.Struct("<iQ")
+U32 = struct.Struct("<I")
+CELL = struct.Struct("<iII")
+VALUE = struct.Struct("<BI")
+
+VALUE_STR = 0
+VALUE_JSON = 1   # anything that isn't a string (hand edited files)
+
+
+def is_binary_project(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _pack_str(text):
+    raw = text.encode("utf-8")
+    return U32.pack(len(raw)) + raw
+
+
+def write_binary_project(workspace, path, progress=None):
+    # progress(done_rows, total_rows) may raise to abort; the target is then left as it was
+    workspace = SparseWorkspace.from_json(workspace)
+    atomic_write(path, lambda f: _write_file(workspace, f, progress), suffix=EXTENSION, binary=True)
+
+
+def _write_file(workspace, f, progress):
+    templates = {}
+    row_table = []
+    cell_count = 0
+    total = len(workspace.row_order)
+    f.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0, 0, 0, 0, 0))
+
+    for r, cells in workspace.iter_rows():
+        row_table.append((r, f.tell()))
+        parts = [U32.pack(len(cells))]
+        for c, cell in cells:
+            tid = templates.setdefault(cell.template, len(templates))
+            values = cell.values
+            parts.append(CELL.pack(c, tid, len(values)))
+            for value in values:
+                if isinstance(value, str):
+                    raw, kind = value.encode("utf-8"), VALUE_STR
+                else:
+                    raw, kind = json.dumps(value).encode("utf-8"), VALUE_JSON
+                parts.append(VALUE.pack(kind, len(raw)))
+                parts.append(raw)
+        f.write(b"".join(parts))
+        cell_count += len(cells)
+        if progress is not None:
+            progress(len(row_table), total)
+
+    templates_offset = f.tell()
+    for template in templates:
+        f.write(_pack_str(template.content))
+        f.write(_pack_str(template.color))
+
+    rows_offset = f.tell()
+    f.write(b"".join(ROW_ENTRY.pack(r, offset) for r, offset in row_table))
+
+    f.seek(0)
+    f.write(HEADER.pack(MAGIC, VERSION, 0, len(row_table), cell_count, len(templates),
+                        workspace.max_col, templates_offset, rows_offset))
+
+
+class BinaryProject:
+    # Read side of a .kkp file, memory mapped
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_index(path)
+        except BaseException:
+            # A damaged file doesn't stay mapped
+            self.mm.close()
+            raise
+
+    def _read_index(self, path):
+        (magic, version, _, self.row_count, self.cell_count, template_count,
+         self.max_col, templates_offset, self.rows_offset) = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a binary project")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported binary project version {version}")
+
+        # The template table is small (one entry per distinct box), decode it once
+        self.templates = []
+        pos = templates_offset
+        for _ in range(template_count):
+            content, pos = self._read_str(pos)
+            color, pos = self._read_str(pos)
+            self.templates.append(intern_template(content, color))
+
+        # Row numbers only; records are located through the table when needed
+        self.offsets = {}
+        for i in range(self.row_count):
+            r, offset = ROW_ENTRY.unpack_from(self.mm, self.rows_offset + i * ROW_ENTRY.size)
+            self.offsets[r] = offset
+
+    def _read_str(self, pos):
+        (length,) = U32.unpack_from(self.mm, pos)
+        pos += U32.size
+        return self.mm[pos:pos + length].decode("utf-8"), pos + length
+
+    def read_row(self, r):
+        # [(c, cell), ...] of row r, decoded from the mapping
+        pos = self.offsets[r]
+        (count,) = U32.unpack_from(self.mm, pos)
+        pos += U32.size
+        cells = []
+        for _ in range(count):
+            c, tid, n_values = CELL.unpack_from(self.mm, pos)
+            pos += CELL.size
+            values = []
+            for _ in range(n_values):
+                kind, length = VALUE.unpack_from(self.mm, pos)
+                pos += VALUE.size
+                text = self.mm[pos:pos + length].decode("utf-8")
+                pos += length
+                values.append(json.loads(text) if kind == VALUE_JSON else text)
+            cells.append((c, Cell(self.templates[tid], values)))
+        return cells
+
+    def close(self):
+        self.mm.close()
+
+
+def open_binary_workspace(path):
+    # Workspace view over a .kkp file; rows are decoded as they are used
+    project = BinaryProject(path)
+    return LazyRowWorkspace(project.offsets, project.read_row, project.cell_count, project.max_col,
+                            release=project.close)
@@ -0,0 +1,107 @@
+import weakref
+from collections.abc import Mapping
+
+# Workspace cells. A cell is its box template (content + color, interned: all
+# cells made from the same box share one BoxTemplate) and its values.
+# Cells are immutable: an edit makes a new Cell, so undo steps and export
+# plans can keep references to old ones.
+#
+# On disk a file carries its own template table, "templates": [[content, color], ...],
+# and each cell is [template id, values]. The older inline form
+# {"content": ..., "color": ..., "values": [...]} is still read (and is what
+# journal records use, so they don't depend on any table).
+
+# Snapshot / project key of the template table
+TEMPLATES_KEY = "templates"
+
+
+class BoxTemplate:
+    __slots__ = ("content", "color", "__weakref__")
+
+    def __init__(self, content, color):
+        self.content = content
+        self.color = color
+
+
+# Held weakly: templates no cell uses any more (e.g. from unmatched lines of
+# an import that was undone) go away with their last cell
+_interned = weakref.WeakValueDictionary()
+
+
+def intern_template(content, color):
+    # The one BoxTemplate for this content and color
+    key = (content, color)
+    template = _interned.get(key)
+    if template is None:
+        template = _interned[key] = BoxTemplate(content, color)
+    return template
+
+
+class Cell:
+    __slots__ = ("template", "values")
+
+    def __init__(self, template, values=()):
+        self.template = template
+        self.values = tuple(values)
+
+    @property
+    def content(self):
+        return self.template.content
+
+    @property
+    def color(self):
+        return self.template.color
+
+    def with_value(self, idx, value):
+        # A new cell with values[idx] replaced (padded with "" up to idx)
+        values = list(self.values)
+        while len(values) <= idx:
+            values.append("")
+        values[idx] = value
+        return Cell(self.template, values)
+
+
+def new_cell(box):
+    # An empty cell from a palette box
+    return Cell(intern_template(box["content"], box["color"]))
+
+
+class TemplateTable:
+    # Template ids of one file: decoded from its "templates" list when reading,
+    # handed out in order of first use when writing
+
+    def __init__(self, rows=()):
+        self.templates = [intern_template(content, color) for content, color in rows]
+        self.ids = {template: tid for tid, template in enumerate(self.templates)}
+
+    def id(self, template):
+        tid = self.ids.get(template)
+        if tid is None:
+            tid = self.ids[template] = len(self.templates)
+            self.templates.append(template)
+        return tid
+
+    def to_json(self):
+        return [[template.content, template.color] for template in self.templates]
+
+
+def cell_from_json(raw, table=None):
+    # Compact cells checked first: they are what files hold, and the Mapping
+    # check (an ABC) is comparatively slow
+    if type(raw) is list:
+        tid, values = raw
+        return Cell(table.templates[tid], values)
+    if isinstance(raw, Cell):
+        return raw
+    if isinstance(raw, Mapping):
+        return Cell(intern_template(raw["content"], raw["color"]), raw.get("values", ()))
+    raise ValueError(f"Not a cell: {raw!r}")
+
+
+def cell_to_json(cell, table=None):
+    # [id, values] against table; without one the inline dict. None stays None.
+    if cell is None:
+        return None
+    if table is None:
+        return {"content": cell.content, "color": cell.color, "values": list(cell.values)}
+    return [table.id(cell.template), list(cell.values)]
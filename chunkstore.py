@@ -0,0 +1,332 @@
+import json
+import os
+import shutil
+import tempfile
+from bisect import bisect_left
+from collections import OrderedDict
+
+from cells import TEMPLATES_KEY, TemplateTable, cell_from_json, cell_to_json
+from persistence import atomic_write
+from workspace import LazyRowWorkspace, SparseWorkspace, parse_cell_key
+
+# Chunked project layout: a directory holding a small manifest plus one JSON
+# file per block of CHUNK_ROWS rows ({"r_c": [template id, values]}). The
+# template table (see cells.py) is in the manifest and shared by all chunks.
+#
+#   project.kkc/manifest.json
+#   project.kkc/chunk-000000.json      rows 0..255
+#   project.kkc/chunk-000003.json      rows 768..1023
+#
+# ChunkedWorkspace reads a chunk the first time one of its rows is touched
+# (the virtual grid only touches rows in view), keeps at most max_chunks of
+# them in memory and writes a chunk back only if it was edited.
+#
+# Chunk files and the manifest only change together, in save() (a checkpoint):
+# edited chunks go to chunk-NNNNNN.pending.json first (an evicted dirty chunk
+# goes there straight away), then manifest.pending.json marks the set complete
+# and they all replace the live files. Opening a store finishes a save that got
+# that far and drops pending files of one that didn't (recover), so the files
+# always describe the last checkpoint; the journal holds everything after it.
+#
+# Readers on other threads (snapshots, export plans) don't read the store's
+# files: pin() hard-links the current ones into a directory of their own
+# (project.kkc.pinned-XXXX next to the store), which saves and evictions never
+# touch, since they replace files instead of rewriting them.
+
+EXTENSION = ".kkc"
+MANIFEST = "manifest.json"
+PENDING_MANIFEST = "manifest.pending.json"
+PENDING_SUFFIX = ".pending.json"
+FORMAT = "kutukodlama-chunks"
+VERSION = 2
+# Version 1 stores inline cells and no template table; still read
+READ_VERSIONS = (1, 2)
+DEFAULT_CHUNK_ROWS = 256
+# Chunks kept decoded at once (64 x 256 rows); the least recently used one is evicted
+DEFAULT_MAX_CHUNKS = 64
+
+
+def _write_json(path, data):
+    # Serialized in one go: json.dump into a file runs the pure Python encoder,
+    # several times slower than dumps for chunk-sized documents
+    text = json.dumps(data)
+    atomic_write(path, lambda f: f.write(text), suffix=".json")
+
+
+def chunk_root(path):
+    # The project directory, also when its manifest.json was picked in a file dialog
+    if os.path.basename(path) == MANIFEST:
+        return os.path.dirname(path)
+    return path
+
+
+def is_chunked_project(path):
+    return os.path.isfile(os.path.join(chunk_root(path), MANIFEST))
+
+
+def chunk_file(root, k):
+    return os.path.join(root, f"chunk-{k:06d}.json")
+
+
+def pending_file(root, k):
+    return os.path.join(root, f"chunk-{k:06d}{PENDING_SUFFIX}")
+
+
+def recover(root):
+    # Finishes or discards a save() interrupted by a crash
+    names = os.listdir(root)
+    pending = [name for name in names if name.startswith("chunk-") and name.endswith(PENDING_SUFFIX)]
+    if PENDING_MANIFEST in names:
+        # Every pending chunk was written before the pending manifest
+        for name in pending:
+            os.replace(os.path.join(root, name), os.path.join(root, name[:-len(PENDING_SUFFIX)] + ".json"))
+        os.replace(os.path.join(root, PENDING_MANIFEST), os.path.join(root, MANIFEST))
+    else:
+        for name in pending:
+            os.remove(os.path.join(root, name))
+
+
+def read_chunk_file(path, templates):
+    # {r: [(c, cell), ...]}, cells in column order; {} for a chunk without a file
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    rows = {}
+    for key, cell in data.items():
+        r, c = parse_cell_key(key)
+        rows.setdefault(r, []).append((c, cell_from_json(cell, templates)))
+    for cells in rows.values():
+        cells.sort(key=lambda item: item[0])
+    return rows
+
+
+class PinnedChunks:
+    # load_row over a directory of pinned chunk files (see the top), for one
+    # worker thread; release() removes the directory
+
+    def __init__(self, path, chunk_rows, templates):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.templates = templates
+        self._streamed = (None, {})
+
+    def load_row(self, r):
+        k = r // self.chunk_rows
+        streamed_k, rows = self._streamed
+        if streamed_k != k:
+            rows = read_chunk_file(chunk_file(self.path, k), self.templates)
+            self._streamed = (k, rows)
+        return rows.get(r, [])
+
+    def release(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def _write_manifest(root, chunk_rows, row_order, cell_count, max_col, extra, templates, name=MANIFEST):
+    # row_order is sorted: each chunk's rows are one slice of it
+    chunks = {}
+    lo = 0
+    while lo < len(row_order):
+        k = row_order[lo] // chunk_rows
+        hi = bisect_left(row_order, (k + 1) * chunk_rows, lo)
+        chunks[str(k)] = row_order[lo:hi]
+        lo = hi
+    _write_json(os.path.join(root, name), {
+        "format": FORMAT, "version": VERSION, "chunk_rows": chunk_rows,
+        "cells": cell_count, "max_col": max_col, "rows": chunks, "extra": extra,
+        TEMPLATES_KEY: templates.to_json(),
+    })
+
+
+def write_chunked_project(workspace, path, chunk_rows=DEFAULT_CHUNK_ROWS, progress=None):
+    # progress(done_rows, total_rows) may raise to abort
+    workspace = SparseWorkspace.from_json(workspace)
+    os.makedirs(path, exist_ok=True)
+    total = len(workspace.row_order)
+    templates = TemplateTable()
+    written = set()
+    chunk, current = {}, None
+    for done, (r, cells) in enumerate(workspace.iter_rows(), 1):
+        k = r // chunk_rows
+        if k != current and chunk:
+            _write_json(chunk_file(path, current), chunk)
+            written.add(current)
+            chunk = {}
+        current = k
+        for c, cell in cells:
+            chunk[f"{r}_{c}"] = cell_to_json(cell, templates)
+        if progress is not None:
+            progress(done, total)
+    if chunk:
+        _write_json(chunk_file(path, current), chunk)
+        written.add(current)
+    # Chunks of an older save into the same directory
+    for name in os.listdir(path):
+        number = name[6:-5]
+        if name.startswith("chunk-") and name.endswith(".json") and number.isdigit() and int(number) not in written:
+            os.remove(os.path.join(path, name))
+    _write_manifest(path, chunk_rows, workspace.row_order, len(workspace) - len(workspace.extra),
+                    workspace.max_col, workspace.extra, templates)
+
+
+class ChunkedWorkspace(LazyRowWorkspace):
+
+    def __init__(self, path, max_chunks=DEFAULT_MAX_CHUNKS, read_only=False):
+        # read_only: a store that belongs to someone else (a project being
+        # exported or imported, maybe another app's live store). Opening it
+        # changes nothing; an interrupted save there is left to its owner.
+        self.path = chunk_root(path)
+        if not read_only:
+            recover(self.path)
+        with open(os.path.join(self.path, MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT:
+            raise ValueError(f"{path}: not a chunked project")
+        if manifest.get("version") not in READ_VERSIONS:
+            raise ValueError(f"{path}: unsupported chunked project version {manifest.get('version')}")
+        rows = [r for chunk_rows in manifest["rows"].values() for r in chunk_rows]
+        super().__init__(rows, self.load_row, manifest["cells"], manifest["max_col"])
+        self.extra = manifest.get("extra", {})
+        self.chunk_rows = manifest["chunk_rows"]
+        # Grows as edited chunks are written back; the manifest is saved after them
+        self.templates = TemplateTable(manifest.get(TEMPLATES_KEY, ()))
+        self.max_chunks = max_chunks
+        self.loaded = OrderedDict()    # chunk -> None, least recently used first
+        self.dirty = set()
+        self.pending = set()           # chunks whose current contents are in their pending file
+        self._streamed = (None, {})    # last chunk decoded by load_row
+
+    def snapshot(self):
+        # Rows of chunks that aren't loaded come from pinned files (see top);
+        # never writes. close() it when done.
+        snap = super().snapshot()
+        reader = self.pin_files()
+        snap.path, snap.pending = reader.path, set()
+        snap.load_row, snap.release = reader.load_row, reader.release
+        snap._streamed = (None, {})
+        snap.loaded = OrderedDict(self.loaded)
+        snap.dirty = set()
+        return snap
+
+    def pin(self):
+        reader = self.pin_files()
+        return reader.load_row, reader.release
+
+    def pin_files(self):
+        # The files of every chunk with unloaded rows, as they are now. A link
+        # costs nothing; where the file system has none, the file is copied.
+        pinned = tempfile.mkdtemp(prefix=os.path.basename(self.path) + ".pinned-",
+                                  dir=os.path.dirname(os.path.abspath(self.path)))
+        for k in sorted({r // self.chunk_rows for r in self.unloaded}):
+            source = pending_file(self.path, k) if k in self.pending else chunk_file(self.path, k)
+            if not os.path.exists(source):
+                continue
+            try:
+                os.link(source, chunk_file(pinned, k))
+            except OSError:
+                shutil.copyfile(source, chunk_file(pinned, k))
+        return PinnedChunks(pinned, self.chunk_rows, self.templates)
+
+    def chunk_range(self, k):
+        # Positions in row_order of the rows that belong to chunk k
+        lo = bisect_left(self.row_order, k * self.chunk_rows)
+        return lo, bisect_left(self.row_order, (k + 1) * self.chunk_rows)
+
+    def read_chunk(self, k):
+        # {r: [(c, cell), ...]} straight from the file (the pending one if written since the last save)
+        path = pending_file(self.path, k) if k in self.pending else chunk_file(self.path, k)
+        return read_chunk_file(path, self.templates)
+
+    def load_row(self, r):
+        # Used by iter_rows (export) for rows not in memory: reads the chunk
+        # once for all of its rows instead of keeping it
+        k = r // self.chunk_rows
+        streamed_k, rows = self._streamed
+        if streamed_k != k:
+            rows = self.read_chunk(k)
+            self._streamed = (k, rows)
+        return rows.get(r, [])
+
+    def ensure_chunk(self, k):
+        if k in self.loaded:
+            self.loaded.move_to_end(k)
+            return
+        rows = self.read_chunk(k)
+        lo, hi = self.chunk_range(k)
+        for r in self.row_order[lo:hi]:
+            if r not in self.unloaded:
+                continue
+            self.unloaded.discard(r)
+            cells = rows.get(r, [])
+            self.rows[r] = dict(cells)
+            self.row_cols[r] = [c for c, _ in cells]
+            for c, _ in cells:
+                self.col_counts[c] = self.col_counts.get(c, 0) + 1
+        self.loaded[k] = None
+        while len(self.loaded) > self.max_chunks:
+            # Clean chunks first: dropping them costs nothing, a dirty one is written back
+            # (never the chunk just loaded, the caller is about to use it)
+            victim = next((old for old in self.loaded if old != k and old not in self.dirty),
+                          next(iter(self.loaded)))
+            self.evict(victim)
+
+    def evict(self, k):
+        # A dirty chunk goes to its pending file; only save() makes it part of the store
+        if k in self.dirty:
+            self.write_chunk(k)
+        del self.loaded[k]
+        lo, hi = self.chunk_range(k)
+        for r in self.row_order[lo:hi]:
+            for c in self.row_cols.pop(r):
+                self.col_counts[c] -= 1
+                if not self.col_counts[c]:
+                    del self.col_counts[c]
+            del self.rows[r]
+            self.unloaded.add(r)
+
+    def write_chunk(self, k):
+        # To the pending file; an emptied chunk is written too (as {}), it replaces the old one
+        lo, hi = self.chunk_range(k)
+        data = {}
+        for r in self.row_order[lo:hi]:
+            row = self.rows[r]
+            for c in self.row_cols[r]:
+                data[f"{r}_{c}"] = cell_to_json(row[c], self.templates)
+        _write_json(pending_file(self.path, k), data)
+        self.pending.add(k)
+        if self._streamed[0] == k:
+            self._streamed = (None, {})
+        self.dirty.discard(k)
+
+    def save(self):
+        # Dirty chunks, then the manifest that describes them, committed as one (see top)
+        for k in sorted(self.dirty):
+            self.write_chunk(k)
+        _write_manifest(self.path, self.chunk_rows, self.row_order, self._len, self._max_col, self.extra,
+                        self.templates, PENDING_MANIFEST)
+        for k in sorted(self.pending):
+            os.replace(pending_file(self.path, k), chunk_file(self.path, k))
+        os.replace(os.path.join(self.path, PENDING_MANIFEST), os.path.join(self.path, MANIFEST))
+        self.pending.clear()
+        self._streamed = (None, {})
+
+    # Rows are read chunk-wise, edits mark their chunk dirty
+
+    def ensure_row(self, r):
+        if r in self.unloaded:
+            self.ensure_chunk(r // self.chunk_rows)
+
+    def set_cell(self, r, c, cell):
+        # The whole chunk has to be in memory before it can be written back
+        k = r // self.chunk_rows
+        self.ensure_chunk(k)
+        SparseWorkspace.set_cell(self, r, c, cell)
+        self.dirty.add(k)
+
+    def pop_cell(self, r, c):
+        k = r // self.chunk_rows
+        self.ensure_chunk(k)
+        cell = super().pop_cell(r, c)
+        self.dirty.add(k)
+        return cell
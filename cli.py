@@ -0,0 +1,106 @@
+import argparse
+import sys
+
+# Nothing in here may import tkinter: these commands run on machines without a display.
+
+HEADLESS_COMMANDS = ("export", "batch", "parse")
+
+
+def is_headless(argv):
+    return bool(argv) and argv[0] in HEADLESS_COMMANDS
+
+
+def cmd_export(args):
+    from exporter import export_to_file, read_workspace
+    from workspace import LazyRowWorkspace
+
+    workspace = read_workspace(args.project)
+    try:
+        if args.output == "-":
+            export_to_file(workspace, sys.stdout)
+            sys.stdout.write("\n")
+        else:
+            with open(args.output, "w", encoding="utf-8") as f:
+                export_to_file(workspace, f)
+    finally:
+        if isinstance(workspace, LazyRowWorkspace):
+            workspace.close()
+    return 0
+
+
+def cmd_batch(args):
+    import os
+    import time
+    from batch import find_projects, run_batch, summarize
+
+    projects = find_projects(args.inputs, args.suffix)
+    if not projects:
+        print("No project files found", file=sys.stderr)
+        return 1
+    jobs = args.jobs or os.cpu_count() or 1
+    results = []
+    start = time.perf_counter()
+    for result in run_batch(projects, args.out_dir, args.suffix, jobs):
+        results.append(result)
+        if result.ok:
+            print(f"OK   {result.project} -> {result.output} ({result.cells} cells, {result.seconds:.2f} s)")
+        else:
+            print(f"FAIL {result.project}: {result.error}")
+    print(summarize(results, time.perf_counter() - start, min(jobs, len(projects))))
+    return 0 if all(r.ok for r in results) else 1
+
+
+def cmd_parse(args):
+    from journal import load_snapshot
+    from persistence import atomic_write_json
+    from textimport import read_export_text
+    from workspace import project_to_json
+
+    # Templates come from the palette in app_data.json
+    categories = load_snapshot(args.data)["categories"]
+    boxes = [box for category in categories for box in category["boxes"]]
+    if not boxes:
+        print(f"{args.data}: no box templates to match against", file=sys.stderr)
+        return 1
+    workspace, unmatched = read_export_text(args.text, boxes)
+    atomic_write_json(args.output, project_to_json(workspace))
+    print(f"{len(workspace)} cells, {unmatched} lines matched no template")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="app.py", description="Visual Coding App, headless commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="export a saved project to text")
+    p.add_argument("project", help="project file written by Save (or app_data.json)")
+    p.add_argument("output", help="output text file, - for stdout")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("batch", help="export many saved projects in parallel")
+    p.add_argument("inputs", nargs="+", help="project files, directories or glob patterns")
+    p.add_argument("-o", "--out-dir", help="where the text files go (default: next to each project)")
+    p.add_argument("--suffix", default=".export.txt", help="appended to each project name (default: .export.txt)")
+    p.add_argument("-j", "--jobs", type=int, help="worker processes (default: one per core)")
+    p.set_defaults(func=cmd_batch)
+
+    p = sub.add_parser("parse", help="turn exported text back into a project")
+    p.add_argument("text", help="text file written by Export")
+    p.add_argument("output", help="project file to write (JSON, as written by Save)")
+    p.add_argument("--data", default="app_data.json", help="where the box templates come from")
+    p.set_defaults(func=cmd_parse)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+# Frames of these files are left out of the memory diffs
+IGNORED_FILES = (tracemalloc.__file__, __file__)
+
+
+class RenderDiagnostics:
+    # Samples taken after each grid render while enabled: live Tcl commands,
+    # traced variables and what tracemalloc saw allocated since the last render.
+    # count_commands / count_traces are callables supplied by the UI.
+
+    def __init__(self, count_commands, count_traces, top=10):
+        self.count_commands = count_commands
+        self.count_traces = count_traces
+        self.top = top
+        self.enabled = False
+        self.started_tracing = False
+        self.last_report = None
+        self._snapshot = None
+        self._commands = 0
+        self._traces = 0
+
+    def start(self):
+        if self.enabled:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        self.enabled = True
+        self._snapshot = self._take_snapshot()
+        self._commands = self.count_commands()
+        self._traces = self.count_traces()
+        self.last_report = None
+
+    def stop(self):
+        self.enabled = False
+        self._snapshot = None
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def _take_snapshot(self):
+        snapshot = tracemalloc.take_snapshot()
+        return snapshot.filter_traces([tracemalloc.Filter(False, name) for name in IGNORED_FILES])
+
+    def on_render(self, label):
+        if not self.enabled:
+            return None
+        snapshot = self._take_snapshot()
+        stats = snapshot.compare_to(self._snapshot, "lineno")
+        commands = self.count_commands()
+        traces = self.count_traces()
+        current, peak = tracemalloc.get_traced_memory()
+
+        self.last_report = {
+            "render": label,
+            "tcl_commands": commands,
+            "tcl_commands_delta": commands - self._commands,
+            "traced_vars": traces,
+            "traced_vars_delta": traces - self._traces,
+            "memory_delta": sum(stat.size_diff for stat in stats),
+            "traced_memory": current,
+            "traced_peak": peak,
+            "top": [str(stat) for stat in stats[:self.top]],
+        }
+        self._snapshot = snapshot
+        self._commands = commands
+        self._traces = traces
+        return self.last_report
+
+
+def format_report(report):
+    if report is None:
+        return "No render since diagnostics were enabled."
+    lines = [
+        f"After render: {report['render']}",
+        f"Tcl commands: {report['tcl_commands']} ({report['tcl_commands_delta']:+d})",
+        f"Traced variables: {report['traced_vars']} ({report['traced_vars_delta']:+d})",
+        f"Memory since last render: {report['memory_delta'] / 1024:+.1f} KiB",
+        f"Traced memory: {report['traced_memory'] / 1024:.0f} KiB (peak {report['traced_peak'] / 1024:.0f} KiB)",
+        "",
+        "Top allocation changes:",
+    ]
+    lines.extend(report["top"])
+    return "\n".join(lines)
+
+
+class LatencyStats:
+    # Drag latency: time from a motion event to the screen update that showed
+    # it, plus how many motion events were merged into each update.
+
+    def __init__(self, keep=1000):
+        self.samples = deque(maxlen=keep)
+        self.drags = 0
+        self.events = 0
+        self.updates = 0
+
+    def record(self, ms):
+        self.samples.append(ms)
+        self.updates += 1
+
+    def summary(self):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return {
+            "drags": self.drags,
+            "events": self.events,
+            "updates": self.updates,
+            "mean_ms": sum(ordered) / len(ordered),
+            "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            "max_ms": ordered[-1],
+        }
+
+
+def format_latency(summary):
+    if summary is None:
+        return "Drag latency: no drags yet."
+    return (f"Drag latency: mean {summary['mean_ms']:.1f} ms, p95 {summary['p95_ms']:.1f} ms, "
+            f"max {summary['max_ms']:.1f} ms ({summary['events']} motion events -> "
+            f"{summary['updates']} updates over {summary['drags']} drags)")
+
+
+class StartupProfile:
+    # Wall time of each startup phase, printed with --profile-startup.
+    # A phase entered several times (idle chunks) is summed.
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.calls = {}
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - t0
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def report(self):
+        lines = ["Startup profile:"]
+        for name, seconds in self.phases.items():
+            calls = self.calls[name]
+            suffix = f" ({calls} chunks)" if calls > 1 else ""
+            lines.append(f"  {name:<24} {seconds * 1000:9.1f} ms{suffix}")
+        lines.append(f"  {'total (wall)':<24} {(time.perf_counter() - self.started) * 1000:9.1f} ms")
+        return "\n".join(lines)
@@ -0,0 +1,179 @@
+import json
+import os
+
+from binproject import is_binary_project, open_binary_workspace
+from cells import TEMPLATES_KEY
+from chunkstore import ChunkedWorkspace, is_chunked_project
+from journal import CHUNKS_KEY
+from templates import fill_template
+from workspace import SparseWorkspace, project_from_json
+
+
+def render_row(cells):
+    # Export text of one row: its cells concatenated left to right
+    return "".join(fill_template(cell.content, cell.values) for _, cell in cells).rstrip()
+
+
+def iter_export_lines(workspace, progress=None):
+    # One line per row, only occupied cells are visited.
+    # Empty rows between filled ones come out as blank lines; nothing is
+    # emitted after the last filled row.
+    # progress(done_rows, total_rows) is called after each filled row; it may
+    # raise to stop the export.
+    workspace = SparseWorkspace.from_json(workspace)
+    total = len(workspace.row_order)
+    next_row = 0
+    for done, (r, cells) in enumerate(workspace.iter_rows(), 1):
+        for _ in range(next_row, r):
+            yield ""
+        yield render_row(cells)
+        next_row = r + 1
+        if progress is not None:
+            progress(done, total)
+
+
+def export_to_file(workspace, f, progress=None):
+    # Streams the export text into an open text file, line by line
+    write_lines(iter_export_lines(workspace, progress), f)
+
+
+def write_lines(lines, f):
+    first = True
+    for line in lines:
+        if not first:
+            f.write("\n")
+        f.write(line)
+        first = False
+
+
+class ExportCache:
+    # Rendered text of each row, so a re-export only renders the rows that
+    # changed since the last one. The model calls invalidate(r) for every
+    # edited row and clear() when the whole workspace is replaced.
+    # versions tells a result rendered on a worker from a row edited meanwhile.
+
+    def __init__(self):
+        self.lines = {}       # r -> row text
+        self.versions = {}    # r -> edits seen so far
+        self.epoch = 0        # bumped by clear()
+        # Rows changed since the last take_changes(), for the live preview
+        self.changed = set()
+        self.full = True
+
+    def invalidate(self, r):
+        self.lines.pop(r, None)
+        self.versions[r] = self.versions.get(r, 0) + 1
+        self.changed.add(r)
+
+    def clear(self):
+        self.lines = {}
+        self.versions = {}
+        self.epoch += 1
+        self.changed = set()
+        self.full = True
+
+    def take_changes(self):
+        # (everything changed?, rows changed) since the previous call
+        full, changed = self.full, self.changed
+        self.full, self.changed = False, set()
+        return full, changed
+
+    def row_text(self, workspace, r):
+        # On the thread that owns the workspace
+        text = self.lines.get(r)
+        if text is None:
+            text = "".join(render_row(cells) for _, cells in workspace.iter_rows(r, r + 1))
+            self.lines[r] = text
+        return text
+
+    def store(self, plan):
+        # Keeps what a plan rendered, unless the row was edited in the meantime
+        if plan.epoch != self.epoch:
+            return
+        for r, text in plan.rendered.items():
+            if self.versions.get(r, 0) == plan.versions[r]:
+                self.lines[r] = text
+
+
+class ExportPlan:
+    # One export, gathered on the thread that owns the workspace: cached text
+    # for clean rows, references to the cells of dirty ones. Cells are never
+    # changed in place (see WorkspaceModel.update_row_value), so write() can
+    # run on a worker while editing goes on. What it renders ends up in
+    # .rendered for ExportCache.store.
+
+    def __init__(self, cache, workspace):
+        self.epoch = cache.epoch
+        self.rows = []        # (r, text or None, cells or None)
+        self.versions = {}    # r -> version for the rows to render
+        self.rendered = {}
+        self.load_row = self.release = None
+        unloaded = getattr(workspace, "unloaded", ())
+        for r in workspace.row_order:
+            text = cache.lines.get(r)
+            if text is None:
+                self.versions[r] = cache.versions.get(r, 0)
+                if r in unloaded:
+                    # Decoded by the worker straight from the file, as it is now
+                    if self.load_row is None:
+                        self.load_row, self.release = workspace.pin()
+                    self.rows.append((r, None, None))
+                    continue
+                row = workspace.rows[r]
+                self.rows.append((r, None, [(c, row[c]) for c in workspace.row_cols[r]]))
+            else:
+                self.rows.append((r, text, None))
+
+    def iter_lines(self, progress=None):
+        total = len(self.rows)
+        next_row = 0
+        for done, (r, text, cells) in enumerate(self.rows, 1):
+            for _ in range(next_row, r):
+                yield ""
+            if text is None:
+                text = render_row(cells if cells is not None else self.load_row(r))
+                self.rendered[r] = text
+            yield text
+            next_row = r + 1
+            if progress is not None:
+                progress(done, total)
+
+    def write(self, f, progress=None):
+        try:
+            write_lines(self.iter_lines(progress), f)
+        finally:
+            self.close()
+
+    def close(self):
+        # Done reading rows from the file (write() does this itself)
+        if self.release is not None:
+            self.release()
+            self.release = None
+
+
+class NotAProject(ValueError):
+    # Valid JSON, but not an object: no project, maybe exported text
+    pass
+
+
+def read_workspace(path):
+    # Accepts a project saved with "Save" (templates + compact cells, the older
+    # inline workspace dict, the binary .kkp format or a chunked .kkc directory)
+    # as well as a whole app_data.json
+    # A chunk store is opened read-only: it may be another app's live store
+    if is_chunked_project(path):
+        return ChunkedWorkspace(path, read_only=True)
+    if is_binary_project(path):
+        return open_binary_workspace(path)
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise NotAProject(f"{path}: not a project file")
+    if CHUNKS_KEY in data:
+        return ChunkedWorkspace(os.path.join(os.path.dirname(os.path.abspath(path)), data[CHUNKS_KEY]),
+                                read_only=True)
+    if TEMPLATES_KEY in data:
+        return project_from_json(data)
+    if isinstance(data.get("workspace"), dict) and "categories" in data:
+        return data["workspace"]
+    return data
@@ -0,0 +1,105 @@
+import sys
+
+# Undo/redo for workspace edits.
+#
+# Cells are never changed in place once they are in the workspace: an edit
+# puts a new Cell in (see cells.py), so a step only has to keep references
+# to the cells it replaced and the ones it put in.
+# Everything else is shared with the live workspace, and a step costs memory
+# in proportion to what it changed. An import keeps the whole previous
+# workspace object, which is exactly what it replaced.
+
+# Memory budget of the whole history; the oldest steps are dropped past it
+DEFAULT_UNDO_BYTES = 32 * 1024 * 1024
+
+
+def cell_size(cell):
+    # Rough bytes held by one cell (the cell, its values tuple and the values);
+    # the template is shared with every other cell of the same box
+    if cell is None:
+        return 0
+    values = cell.values
+    return sys.getsizeof(cell) + sys.getsizeof(values) + sum(sys.getsizeof(v) for v in values)
+
+
+class Step:
+    # changes: {"r_c": [cell before, cell after]} (None = empty cell)
+    # workspaces: (before, after) for a step that swaps the whole workspace
+    # bounds: ((max_rows, max_cols) before, after)
+    # merge_key: consecutive steps with the same key fold into one
+    # ops: (journal records back to before, records to after) when the
+    # changes aren't journaled cell by cell (inserted / deleted rows)
+
+    __slots__ = ("label", "changes", "workspaces", "bounds", "merge_key", "ops", "size")
+
+    def __init__(self, label, changes=None, workspaces=None, bounds=None, merge_key=None, ops=None):
+        self.label = label
+        self.changes = changes or {}
+        self.workspaces = workspaces
+        self.bounds = bounds
+        self.merge_key = merge_key
+        self.ops = ops
+        self.size = sys.getsizeof(self) + sum(cell_size(before) + cell_size(after)
+                                              for before, after in self.changes.values())
+        if workspaces is not None:
+            # Decoded cells only; undecoded rows of a binary project live in its file
+            self.size += sum(cell_size(cell) for row in workspaces[0].rows.values() for cell in row.values())
+
+
+class UndoHistory:
+
+    def __init__(self, max_bytes=DEFAULT_UNDO_BYTES):
+        self.max_bytes = max_bytes
+        self.undo_steps = []
+        self.redo_steps = []
+        self.size = 0
+
+    def push(self, step):
+        self._drop_redo()
+        last = self.undo_steps[-1] if self.undo_steps else None
+        if (last is not None and step.merge_key is not None and last.merge_key == step.merge_key
+                and last.changes.keys() == step.changes.keys()):
+            # Same value slot again (typing): keep the first before, take the new after
+            self.size -= last.size
+            for key, (_, after) in step.changes.items():
+                last.changes[key][1] = after
+            last.size = sys.getsizeof(last) + sum(cell_size(b) + cell_size(a) for b, a in last.changes.values())
+            self.size += last.size
+            return
+        self.undo_steps.append(step)
+        self.size += step.size
+        self._trim()
+
+    def break_merge(self):
+        # The next edit starts a new step even in the same slot
+        if self.undo_steps:
+            self.undo_steps[-1].merge_key = None
+
+    def undo(self):
+        if not self.undo_steps:
+            return None
+        step = self.undo_steps.pop()
+        step.merge_key = None
+        self.redo_steps.append(step)
+        return step
+
+    def redo(self):
+        if not self.redo_steps:
+            return None
+        step = self.redo_steps.pop()
+        self.undo_steps.append(step)
+        return step
+
+    def clear(self):
+        self.undo_steps = []
+        self.redo_steps = []
+        self.size = 0
+
+    def _drop_redo(self):
+        for step in self.redo_steps:
+            self.size -= step.size
+        self.redo_steps = []
+
+    def _trim(self):
+        while self.size > self.max_bytes and self.undo_steps:
+            self.size -= self.undo_steps.pop(0).size
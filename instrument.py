@@ -0,0 +1,98 @@
+import functools
+import threading
+import time
+
+from persistence import atomic_write_json
+
+# Opt-in timing of the hot paths (python app.py --instrument[=out.json]).
+# Timers are installed as instance attributes over the methods of one App
+# and its WorkspaceModel; without --instrument nothing is wrapped at all, so
+# the disabled cost is zero rather than "one if per call".
+
+# export_project / save_data aren't here: one waits in a file dialog, the other
+# only marks the data dirty. The writes are timed in DebouncedStore.flush and
+# the background jobs (App.run_task's job argument) instead.
+APP_HOOKS = ("render_grid", "render_box_in_row", "drop_box", "stop_drag", "refresh_boxes")
+# export_to is the preview's full render; Export runs ExportPlan.write on the worker
+MODEL_HOOKS = ("export_to", "apply_cells")
+STORE_HOOKS = ("flush",)
+# Attached to each plan App.export_project makes
+PLAN_HOOKS = ("write",)
+
+DEFAULT_DUMP_PATH = "instrumentation.json"
+
+
+class Instrumentation:
+
+    def __init__(self, dump_path=DEFAULT_DUMP_PATH):
+        self.dump_path = dump_path
+        self.started = time.time()
+        self.calls = {}     # label -> [count, total seconds, max seconds]
+        self.writes = {}    # kind -> [count, total bytes, last bytes, total seconds]
+        self.gauges = {}    # name -> last sampled value
+        self._lock = threading.Lock()
+
+    def attach(self, obj, names, prefix):
+        # Shadows obj.<name> with a timed version; must run before anything
+        # keeps a reference to the bound method (Tk commands, bindings)
+        for name in names:
+            setattr(obj, name, self.timed(getattr(obj, name), f"{prefix}.{name}"))
+
+    def timed(self, fn, label):
+        # fn wrapped to add its run time under label; safe from any thread
+        stats = self.calls.setdefault(label, [0, 0.0, 0.0])
+        lock = self._lock
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with lock:
+                    stats[0] += 1
+                    stats[1] += elapsed
+                    if elapsed > stats[2]:
+                        stats[2] = elapsed
+        return timed
+
+    def record_write(self, kind, nbytes, seconds):
+        # DebouncedStore.on_write: one call per file write of app_data.json / the journal
+        with self._lock:
+            stats = self.writes.setdefault(kind, [0, 0, 0, 0.0])
+            stats[0] += 1
+            stats[1] += nbytes
+            stats[2] = nbytes
+            stats[3] += seconds
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def report(self):
+        with self._lock:
+            return {
+                "started": self.started,
+                "seconds": time.time() - self.started,
+                "calls": {label: {"count": count, "total_ms": total * 1000, "max_ms": worst * 1000,
+                                  "mean_ms": total * 1000 / count if count else 0.0}
+                          for label, (count, total, worst) in self.calls.items()},
+                "writes": {kind: {"count": count, "bytes": nbytes, "last_bytes": last, "total_ms": seconds * 1000}
+                           for kind, (count, nbytes, last, seconds) in self.writes.items()},
+                "gauges": dict(self.gauges),
+            }
+
+    def dump(self, path=None):
+        atomic_write_json(path or self.dump_path, self.report(), indent=2)
+
+
+def format_report(report):
+    lines = [f"{'call':<28}{'count':>7}{'total ms':>10}{'mean':>8}{'max':>8}"]
+    for label, s in sorted(report["calls"].items()):
+        if s["count"]:
+            lines.append(f"{label:<28}{s['count']:>7}{s['total_ms']:>10.1f}{s['mean_ms']:>8.2f}{s['max_ms']:>8.2f}")
+    for kind, s in sorted(report["writes"].items()):
+        lines.append(f"write {kind}: {s['count']}x, {s['bytes'] / 1024:.1f} KiB total, last {s['last_bytes']} B")
+    for name, value in sorted(report["gauges"].items()):
+        lines.append(f"{name}: {value}")
+    return "\n".join(lines)
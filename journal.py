@@ -0,0 +1,198 @@
+import json
+import os
+import threading
+
+from cells import TEMPLATES_KEY
+from persistence import atomic_write_data
+from workspace import project_from_json, project_to_json, shift_rows
+
+# Journal size that triggers a background compaction into app_data.json
+DEFAULT_COMPACT_BYTES = 1024 * 1024
+
+# Snapshot key holding the last journal seq already folded into the snapshot
+SEQ_KEY = "journal_seq"
+# Snapshot key naming a chunk store that holds the workspace instead of the
+# snapshot itself (see chunkstore.py); such snapshots are never compacted here
+CHUNKS_KEY = "workspace_chunks"
+
+
+def apply_op(data, op):
+    # Replays one journal record over the categories + workspace document.
+    # The workspace is decoded (a SparseWorkspace); records carry inline cells.
+    kind = op["op"]
+    if kind == "set_cell":
+        if op["cell"] is None:
+            data["workspace"].pop(op["key"], None)
+        else:
+            data["workspace"][op["key"]] = op["cell"]
+    elif kind == "set_cells":
+        # A range edit: {"r_c": cell or None}
+        _set_cells(data["workspace"], op["cells"])
+    elif kind in ("insert_rows", "delete_rows"):
+        # Just where and how many: the moved cells would make a record as big as the workspace
+        delta = op["count"] if kind == "insert_rows" else -op["count"]
+        _set_cells(data["workspace"], shift_rows(data["workspace"], op["r"], delta))
+    elif kind == "set_value":
+        cell = data["workspace"].get(op["key"])
+        if cell is not None:
+            # Assigned back, not changed in place, so a chunked workspace sees the edit
+            data["workspace"][op["key"]] = cell.with_value(op["idx"], op["value"])
+    elif kind == "create_category":
+        data["categories"].append({"name": op["name"], "boxes": []})
+    elif kind == "rename_category":
+        data["categories"][op["index"]]["name"] = op["name"]
+    elif kind == "add_box":
+        data["categories"][op["category"]]["boxes"].append(op["box"])
+
+
+def _set_cells(workspace, cells):
+    for key, cell in cells.items():
+        if cell is None:
+            workspace.pop(key, None)
+        else:
+            workspace[key] = cell
+
+
+def read_ops(path):
+    # Yields records in order; stops at a torn last line from a crash mid-append
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                break
+
+
+def load_snapshot(path):
+    if not os.path.exists(path):
+        return {"categories": [], "workspace": {}}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return {"categories": [], "workspace": {}}
+
+
+def open_snapshot_workspace(data):
+    # The snapshot's cells (compact with their template table, or inline) as a SparseWorkspace
+    workspace = project_from_json(data)
+    data.pop(TEMPLATES_KEY, None)
+    return workspace
+
+
+class EditJournal:
+    # Append-only log of cell level edits next to the snapshot file.
+    # Every record carries a seq number; the snapshot stores the last seq it
+    # contains, so replaying after a crash never applies a record twice.
+    #
+    # Compaction rotates the journal to <journal>.old on the Tk thread (a rename),
+    # then a worker thread replays .old over the on-disk snapshot and writes it
+    # back atomically. The in-memory data is never touched by the worker.
+
+    def __init__(self, snapshot_path, path=None, compact_bytes=DEFAULT_COMPACT_BYTES):
+        self.snapshot_path = snapshot_path
+        self.path = path or os.path.splitext(snapshot_path)[0] + ".journal"
+        self.old_path = self.path + ".old"
+        self.compact_bytes = compact_bytes
+
+        self.seq = 0
+        self._buffer = []
+        self._compactor = None
+        # Called instead of compact() when set and it returns True (the owner
+        # checkpoints a chunked workspace itself)
+        self.fold = None
+
+    def has_records(self):
+        return os.path.exists(self.path) or os.path.exists(self.old_path)
+
+    def load(self, open_workspace=None):
+        # Last snapshot + leftovers of an interrupted compaction + live journal.
+        # open_workspace(data) returns the workspace the records are replayed into;
+        # by default the snapshot's own cells, decoded.
+        data = load_snapshot(self.snapshot_path)
+        data.setdefault("categories", [])
+        data.setdefault("workspace", {})
+        data["workspace"] = (open_workspace or open_snapshot_workspace)(data)
+        self.seq = data.pop(SEQ_KEY, 0)
+        for path in (self.old_path, self.path):
+            for op in read_ops(path):
+                if op["seq"] <= self.seq:
+                    continue
+                apply_op(data, op)
+                self.seq = op["seq"]
+        return data
+
+    def record(self, op):
+        self.seq += 1
+        op["seq"] = self.seq
+        # Keystrokes in the same value slot collapse into the latest one
+        if self._buffer and op["op"] == "set_value":
+            last = self._buffer[-1]
+            if last["op"] == "set_value" and last["key"] == op["key"] and last["idx"] == op["idx"]:
+                self._buffer[-1] = op
+                return
+        self._buffer.append(op)
+
+    def flush(self):
+        # Returns the number of bytes appended
+        if not self._buffer:
+            return 0
+        lines = "".join(json.dumps(op) + "\n" for op in self._buffer).encode("utf-8")
+        with open(self.path, "ab") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self._buffer = []
+
+        if os.path.getsize(self.path) >= self.compact_bytes:
+            if self.fold is None or not self.fold():
+                self.compact()
+        return len(lines)
+
+    def compact(self):
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        # A leftover .old (crash during compaction) is folded in first; the live
+        # journal gets rotated on a later pass.
+        if not os.path.exists(self.old_path):
+            if not os.path.exists(self.path):
+                return
+            os.replace(self.path, self.old_path)
+        self._compactor = threading.Thread(target=self._compact_old, daemon=True)
+        self._compactor.start()
+
+    def _compact_old(self):
+        data = load_snapshot(self.snapshot_path)
+        if CHUNKS_KEY in data:
+            # The cells live in chunk files owned by the Tk thread; .old stays
+            # and is replayed at load until the next checkpoint
+            return
+        seq = data.pop(SEQ_KEY, 0)
+        data["workspace"] = open_snapshot_workspace(data)
+        for op in read_ops(self.old_path):
+            if op["seq"] <= seq:
+                continue
+            apply_op(data, op)
+            seq = op["seq"]
+        data.update(project_to_json(data["workspace"]))
+        data[SEQ_KEY] = seq
+        atomic_write_data(self.snapshot_path, data)
+        os.remove(self.old_path)
+
+    def wait(self):
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+    def checkpoint(self, data):
+        # Full snapshot of the in-memory data; everything journaled so far is in it
+        self.wait()
+        self._buffer = []
+        atomic_write_data(self.snapshot_path, dict(data, **{SEQ_KEY: self.seq}))
+        for path in (self.old_path, self.path):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,436 @@
+import json
+import os
+import shutil
+from collections import namedtuple
+from collections.abc import Mapping
+from contextlib import nullcontext
+
+from binproject import EXTENSION as BINARY_EXTENSION, write_binary_project
+from cells import TEMPLATES_KEY, cell_to_json, new_cell
+from chunkstore import EXTENSION as CHUNKED_EXTENSION, ChunkedWorkspace, write_chunked_project
+from exporter import ExportCache, ExportPlan, NotAProject, export_to_file, read_workspace
+from history import DEFAULT_UNDO_BYTES, Step, UndoHistory
+from journal import CHUNKS_KEY, EditJournal, load_snapshot, open_snapshot_workspace
+from palette import PaletteIndex
+from persistence import DebouncedStore, DEFAULT_SAVE_DELAY_MS, atomic_write_json
+from textimport import read_export_text
+from workspace import LazyRowWorkspace, SparseWorkspace, parse_cell_key, project_to_json, shift_rows
+
+# The workspace model without any widgets: data, growth rules, edits,
+# export and import. The Tk App drives it; bench.py uses it on its own.
+
+# Workspaces from this many cells up are kept in a chunk store next to
+# app_data.json (<name>.chunks-N/, see chunkstore.py) instead of inside it
+CHUNK_THRESHOLD_CELLS = 50000
+
+# A copied rectangle: its size and {(dr, dc): cell} for the occupied cells.
+# Cells are shared, not copied (they are never changed in place).
+RangeCopy = namedtuple("RangeCopy", "rows cols cells")
+
+
+class WorkspaceModel:
+
+    def __init__(self, data_file="app_data.json", schedule=None, cancel=None,
+                 delay_ms=DEFAULT_SAVE_DELAY_MS, journal=True, profile=None, undo_bytes=DEFAULT_UNDO_BYTES,
+                 chunk_threshold=CHUNK_THRESHOLD_CELLS):
+        self.data_file = data_file
+        self.base_dir = os.path.dirname(os.path.abspath(data_file))
+        self.chunk_threshold = chunk_threshold
+        # Set by open_workspace when the snapshot still has inline cells
+        self.inline_cells = False
+        self.journal = EditJournal(data_file) if journal else None
+        # profile: diagnostics.StartupProfile timing the load phases, or None
+        with self._phase(profile, "data load"):
+            self.data = self.load_data()
+        with self._phase(profile, "key scan"):
+            # In memory the workspace is row indexed; on disk it stays {"r_c": cell}
+            self.data["workspace"] = SparseWorkspace.from_json(self.data["workspace"])
+            self.init_bounds()
+        migrate = not self.is_chunked() and len(self.workspace) >= chunk_threshold
+        with self._phase(profile, "palette index"):
+            # Box search across all categories, kept up to date by add_box
+            self.palette = PaletteIndex(self.data["categories"])
+        # Without a scheduler (headless) nothing is written until flush()/close()
+        self.store = DebouncedStore(data_file, self.to_json, schedule, cancel,
+                                    delay_ms=delay_ms, journal=self.journal)
+        # Drops, value edits and imports; categories and boxes aren't undoable
+        self.history = UndoHistory(undo_bytes)
+        # Export text per row; every workspace change below invalidates its row
+        self.export_cache = ExportCache()
+
+        if self.journal is not None:
+            self.journal.fold = self.fold_journal
+        if migrate:
+            # One-time move of a big app_data.json workspace into a chunk store
+            chunk_dir = self.new_chunk_dir()
+            write_chunked_project(self.workspace, chunk_dir)
+            self.data["workspace"] = ChunkedWorkspace(chunk_dir)
+            # Checkpointed right away: until app_data.json points at the store,
+            # every load would migrate again (and leave another chunk directory)
+            self.save_data()
+            self.flush()
+        elif self.inline_cells:
+            # Written once with the template table; from then on the file is compact
+            self.save_data()
+
+    @staticmethod
+    def _phase(profile, name):
+        return profile.phase(name) if profile is not None else nullcontext()
+
+    # --- Persistence ---
+
+    def load_data(self):
+        if self.journal is not None:
+            # Last snapshot with the journal replayed over it
+            return self.journal.load(self.open_workspace)
+        data = load_snapshot(self.data_file)
+        data["workspace"] = self.open_workspace(data)
+        return data
+
+    def open_workspace(self, data):
+        # The snapshot's own workspace, or the chunk store it points at
+        name = data.pop(CHUNKS_KEY, None)
+        if name is not None:
+            return ChunkedWorkspace(os.path.join(self.base_dir, name))
+        self.inline_cells = TEMPLATES_KEY not in data and bool(data.get("workspace"))
+        return open_snapshot_workspace(data)
+
+    def to_json(self):
+        # The document as written to app_data.json
+        if self.is_chunked():
+            # Edited chunks and the manifest are written; app_data.json just points at them
+            self.workspace.save()
+            name = os.path.relpath(self.workspace.path, self.base_dir)
+            return dict(self.data, workspace={}, **{CHUNKS_KEY: name})
+        return dict(self.data, **project_to_json(self.workspace))
+
+    def is_chunked(self):
+        return isinstance(self.workspace, ChunkedWorkspace)
+
+    def fold_journal(self):
+        # Journal past its size limit. With a chunk store a checkpoint is cheap
+        # (dirty chunks and a small app_data.json), so it replaces compaction.
+        if not self.is_chunked():
+            return False
+        self.journal.checkpoint(self.to_json())
+        return True
+
+    def new_chunk_dir(self):
+        # A fresh chunk store directory. Stores are never reused: undo steps may
+        # still hold a replaced workspace whose chunks live in the old one.
+        prefix = os.path.splitext(os.path.basename(self.data_file))[0] + ".chunks-"
+        taken = [int(name[len(prefix):]) for name in os.listdir(self.base_dir)
+                 if name.startswith(prefix) and name[len(prefix):].isdigit()]
+        return os.path.join(self.base_dir, f"{prefix}{max(taken, default=0) + 1}")
+
+    def remove_stale_chunk_dirs(self):
+        # Chunk stores other than the live one (replaced by imports, or left by a crash)
+        prefix = os.path.splitext(os.path.basename(self.data_file))[0] + ".chunks-"
+        live = os.path.abspath(self.workspace.path) if self.is_chunked() else None
+        for name in os.listdir(self.base_dir):
+            path = os.path.join(self.base_dir, name)
+            if name.startswith(prefix) and os.path.isdir(path) and path != live:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def save_data(self):
+        # Full rewrite; small edits use record_edit
+        self.store.mark_dirty()
+
+    def record_edit(self, op, **fields):
+        fields["op"] = op
+        self.store.record(fields)
+
+    def flush(self):
+        self.store.flush()
+
+    def close(self):
+        self.store.close()
+        # Undo history goes away with the session, and so do the stores it kept alive
+        self.remove_stale_chunk_dirs()
+
+    # --- Grid bounds ---
+
+    @property
+    def workspace(self):
+        return self.data["workspace"]
+
+    def init_bounds(self):
+        # Calculate max rows: max(10, highest_filled_row + 1 + 10)
+        # Start with 10 columns (0-9)
+        self.max_rows = max(10, self.workspace.max_row + 11)
+        self.max_cols = max(9, self.workspace.max_col) + 1
+
+    # --- Edits ---
+
+    def create_category(self, name="Yeni Kategori"):
+        self.data["categories"].append({"name": name, "boxes": []})
+        self.record_edit("create_category", name=name)
+        return len(self.data["categories"]) - 1
+
+    def rename_category(self, index, name):
+        self.data["categories"][index]["name"] = name
+        self.record_edit("rename_category", index=index, name=name)
+
+    def add_box(self, category_index, content, color):
+        new_box = {"content": content, "color": color}
+        boxes = self.data["categories"][category_index]["boxes"]
+        boxes.append(new_box)
+        self.palette.add(category_index, len(boxes) - 1, new_box)
+        self.record_edit("add_box", category=category_index, box=new_box)
+        return new_box
+
+    def drop_box(self, r, c, box):
+        # Puts a copy of a palette box into cell (r, c).
+        # Returns True when the grid grew (a new row and/or column).
+        cell_key = f"{r}_{c}"
+        
+        # Check if this row was already used
+        row_already_used = self.workspace.has_row(r)
+        before = self.workspace.get_cell(r, c)
+        bounds = self.bounds()
+        
+        self.workspace.set_cell(r, c, new_cell(box))
+        
+        grew = False
+        
+        # 1 satıra herhangi bir şey konulduğu anda +1 satır daha oluşacak.
+        if not row_already_used:
+            self.max_rows += 1
+            grew = True
+            
+        # bir satırın ilk sütunu doluysa o satırda +1 sütun oluşacak.
+        # For a uniform grid the column is added globally.
+        if c == 0:
+            self.max_cols += 1
+            grew = True
+            
+        after = self.workspace.get_cell(r, c)
+        self.export_cache.invalidate(r)
+        self.record_edit("set_cell", key=cell_key, cell=cell_to_json(after))
+        self.history.push(Step("drop", {cell_key: [before, after]}, bounds=(bounds, self.bounds())))
+        return grew
+
+    def update_row_value(self, cell_key, value_idx, new_value):
+        # cell_key is "r_c"
+        if cell_key in self.workspace:
+             # A new cell instead of an in-place change: undo steps keep the old one
+             before = self.workspace[cell_key]
+             after = before.with_value(value_idx, new_value)
+             self.workspace[cell_key] = after
+             self.export_cache.invalidate(parse_cell_key(cell_key)[0])
+             self.record_edit("set_value", key=cell_key, idx=value_idx, value=new_value)
+             # Keystrokes in the same slot are one undo step (until end_edit)
+             self.history.push(Step("edit", {cell_key: [before, after]}, merge_key=(cell_key, value_idx)))
+
+    def end_edit(self):
+        # The editor lost focus: typing into the same slot again is a new undo step
+        self.history.break_merge()
+
+    # --- Range edits ---
+    # One transaction each: however many cells change, that's one journal
+    # record (one write on the next flush), one undo step and one Step handed
+    # back for the UI to redraw just those cells. None when nothing changed.
+
+    def apply_cells(self, label, cells, ops=None):
+        # cells: {"r_c": new cell or None to empty it}
+        # ops: journal records (before, after) to write instead of the cells, see Step
+        bounds = self.bounds()
+        changes = {}
+        for cell_key, cell in cells.items():
+            r, c = parse_cell_key(cell_key)
+            before = self.workspace.get_cell(r, c)
+            if before is cell:
+                continue
+            if cell is None:
+                self.workspace.pop_cell(r, c)
+            else:
+                self.workspace.set_cell(r, c, cell)
+            changes[cell_key] = [before, cell]
+            self.export_cache.invalidate(r)
+        if not changes:
+            return None
+        # Room for one more row / column past the used area, like single drops give
+        self.max_rows = max(self.max_rows, self.workspace.max_row + 2)
+        self.max_cols = max(self.max_cols, self.workspace.max_col + 2)
+        step = Step(label, changes, bounds=(bounds, self.bounds()), ops=ops)
+        self.journal_step(step, 1)
+        self.history.push(step)
+        return step
+
+    def copy_range(self, r0, c0, r1, c1):
+        cells = {}
+        for r, row in self.workspace.iter_rows(r0, r1 + 1):
+            for c, cell in row:
+                if c0 <= c <= c1:
+                    cells[(r - r0, c - c0)] = cell
+        return RangeCopy(r1 - r0 + 1, c1 - c0 + 1, cells)
+
+    def paste_range(self, r, c, copied):
+        # Empty cells of the copied range empty their target too
+        cells = {}
+        for dr in range(copied.rows):
+            for dc in range(copied.cols):
+                cells[f"{r + dr}_{c + dc}"] = copied.cells.get((dr, dc))
+        return self.apply_cells("paste", cells)
+
+    def fill_range(self, r0, c0, r1, c1, box):
+        # One cell object for the whole range
+        cell = new_cell(box)
+        cells = {}
+        for r in range(r0, r1 + 1):
+            for c in range(c0, c1 + 1):
+                cells[f"{r}_{c}"] = cell
+        return self.apply_cells("fill", cells)
+
+    # Inserted / deleted rows move every cell below them; the journal gets the
+    # row operation itself instead (see journal.apply_op)
+
+    def insert_rows(self, r, count=1):
+        # Rows from r on move down by count
+        ops = ([{"op": "delete_rows", "r": r, "count": count}], [{"op": "insert_rows", "r": r, "count": count}])
+        return self.apply_cells("insert rows", shift_rows(self.workspace, r, count), ops)
+
+    def delete_rows(self, r, count=1):
+        # Rows r .. r+count-1 go away, the ones below move up
+        removed = {f"{rr}_{c}": cell_to_json(cell) for rr, row in self.workspace.iter_rows(r, r + count)
+                   for c, cell in row}
+        ops = ([{"op": "insert_rows", "r": r, "count": count}, {"op": "set_cells", "cells": removed}],
+               [{"op": "delete_rows", "r": r, "count": count}])
+        return self.apply_cells("delete rows", shift_rows(self.workspace, r, -count), ops)
+
+    # --- Undo / redo ---
+
+    def bounds(self):
+        return self.max_rows, self.max_cols
+
+    def undo(self):
+        # Returns the step that was undone (the UI refreshes what it touched) or None
+        step = self.history.undo()
+        if step is not None:
+            self._apply_step(step, 0)
+        return step
+
+    def redo(self):
+        step = self.history.redo()
+        if step is not None:
+            self._apply_step(step, 1)
+        return step
+
+    def _apply_step(self, step, side):
+        # side 0 puts the "before" state back, 1 the "after" state
+        if step.workspaces is not None:
+            self.data["workspace"] = step.workspaces[side]
+            self.export_cache.clear()
+            self.save_data()
+        for cell_key, states in step.changes.items():
+            r, c = parse_cell_key(cell_key)
+            cell = states[side]
+            if cell is None:
+                self.workspace.pop_cell(r, c)
+            else:
+                self.workspace.set_cell(r, c, cell)
+            self.export_cache.invalidate(r)
+        self.journal_step(step, side)
+        if step.bounds is not None:
+            self.max_rows, self.max_cols = step.bounds[side]
+
+    def journal_step(self, step, side):
+        # The cell changes of a step (or its ops) towards side, as journal records
+        if step.ops is not None:
+            for record in step.ops[side]:
+                self.record_edit(**record)
+        elif step.changes:
+            self.record_edit("set_cells", cells={cell_key: cell_to_json(states[side])
+                                                 for cell_key, states in step.changes.items()})
+
+    # --- Export / import ---
+
+    # Methods taking a workspace argument may run on a worker thread; they get
+    # a snapshot() and never touch self.data. close() the snapshot afterwards.
+
+    def snapshot(self):
+        return self.workspace.snapshot()
+
+    def export_to(self, f, workspace=None, progress=None):
+        # Without a workspace argument: the live one, through the row cache
+        if workspace is not None:
+            export_to_file(workspace, f, progress)
+            return
+        plan = self.export_plan()
+        plan.write(f, progress)
+        self.export_cache.store(plan)
+
+    def export_plan(self):
+        # Cheap (no rendering); the plan's write() may then run on a worker.
+        # Hand the plan back to export_cache.store() afterwards on this thread.
+        return ExportPlan(self.export_cache, self.workspace)
+
+    def row_text(self, r):
+        return self.export_cache.row_text(self.workspace, r)
+
+    def import_workspace(self, new_workspace):
+        if not isinstance(new_workspace, Mapping):
+            raise ValueError("Project data must be a JSON object")
+        before, bounds = self.workspace, self.bounds()
+        self.data["workspace"] = SparseWorkspace.from_json(new_workspace)
+        self.export_cache.clear()
+        self.save_data()
+        
+        # Re-calc max dimensions
+        self.max_rows = max(10, self.workspace.max_row + 1)
+        self.max_cols = max(10, self.workspace.max_col + 1)
+        # The old workspace object is the undo state, nothing is copied
+        self.history.push(Step("import", workspaces=(before, self.workspace), bounds=(bounds, self.bounds())))
+
+    def save_project_file(self, path, workspace=None, progress=None):
+        # Binary for .kkp, a chunk directory for .kkc, the JSON workspace dict for anything else
+        if workspace is None:
+            workspace = self.workspace
+        if path.lower().endswith(BINARY_EXTENSION):
+            write_binary_project(workspace, path, progress)
+            return
+        if path.lower().endswith(CHUNKED_EXTENSION):
+            write_chunked_project(workspace, path, progress=progress)
+            return
+        atomic_write_json(path, project_to_json(workspace))
+
+    def template_boxes(self):
+        # Every palette box, for matching exported text against (see textimport.py)
+        return [box for category in self.data["categories"] for box in category["boxes"]]
+
+    def read_project(self, path, chunk_dir=None, boxes=None, progress=None):
+        # File reading, parsing and indexing; safe off the Tk thread if boxes
+        # (template_boxes(), taken on the Tk thread) is given.
+        # chunk_dir (from new_chunk_dir) receives chunked and big projects, which
+        # then become the working chunk store instead of living in memory.
+        # Text that isn't a JSON object is taken for an export and matched back
+        # into cells (an export can be a single line like 42 or "x").
+        try:
+            data = read_workspace(path)
+        except (json.JSONDecodeError, NotAProject):
+            if boxes is None:
+                boxes = self.template_boxes()
+            data, _ = read_export_text(path, boxes, progress)
+        workspace = SparseWorkspace.from_json(data)
+        if isinstance(workspace, ChunkedWorkspace):
+            # A .kkc, or the store an app_data.json points at (maybe another
+            # app's live one, maybe this one's): never edited in place
+            if chunk_dir is None:
+                return SparseWorkspace(workspace)
+            # Copied, not parsed; the copy finishes or drops an interrupted save
+            shutil.copytree(workspace.path, chunk_dir)
+            return ChunkedWorkspace(chunk_dir)
+        # A .kkp is copied out here either way, so the file isn't kept mapped (and locked)
+        binary = isinstance(workspace, LazyRowWorkspace)
+        if chunk_dir is not None and len(workspace) >= self.chunk_threshold:
+            # Written row by row; a binary project is streamed, never decoded as a whole
+            write_chunked_project(workspace, chunk_dir)
+            if binary:
+                workspace.close()
+            return ChunkedWorkspace(chunk_dir)
+        if binary:
+            workspace.materialize()
+        return workspace
+
+    def import_file(self, path):
+        self.import_workspace(self.read_project(path, self.new_chunk_dir()))
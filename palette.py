@@ -0,0 +1,54 @@
+import heapq
+import re
+
+# Search over the box palette. Every token of a box's content (template
+# text and the // description alike) is indexed under all of its prefixes,
+# so a query is a few dict lookups and one set intersection, whatever the
+# number of boxes.
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Boxes shown for one query
+SEARCH_RESULT_LIMIT = 50
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+class PaletteIndex:
+    # prefix -> set of box ids; a box id is (category index, position in the category)
+
+    def __init__(self, categories):
+        self.categories = categories
+        self.prefixes = {}
+        # Boxes share most of their tokens: group by token first, expand prefixes once per token
+        by_token = {}
+        for category_index, category in enumerate(categories):
+            for box_index, box in enumerate(category["boxes"]):
+                for token in set(tokenize(box["content"])):
+                    by_token.setdefault(token, []).append((category_index, box_index))
+        for token, ids in by_token.items():
+            for end in range(1, len(token) + 1):
+                self.prefixes.setdefault(token[:end], set()).update(ids)
+
+    def add(self, category_index, box_index, box):
+        box_id = (category_index, box_index)
+        for token in set(tokenize(box["content"])):
+            for end in range(1, len(token) + 1):
+                self.prefixes.setdefault(token[:end], set()).add(box_id)
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        # Boxes whose content has a token starting with every query word,
+        # in palette order: [(category index, box), ...]
+        words = set(tokenize(query))
+        if not words:
+            return []
+        matches = []
+        for word in words:
+            ids = self.prefixes.get(word)
+            if not ids:
+                return []
+            matches.append(ids)
+        matches.sort(key=len)
+        found = matches[0].intersection(*matches[1:]) if len(matches) > 1 else matches[0]
+        return [(c, self.categories[c]["boxes"][b]) for c, b in heapq.nsmallest(limit, found)]
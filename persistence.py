@@ -0,0 +1,151 @@
+import json
+import os
+import tempfile
+import time
+
+# Idle window (ms) after the last edit before app_data.json is rewritten
+DEFAULT_SAVE_DELAY_MS = 500
+# Upper bound so a user who never stops typing still gets a save
+DEFAULT_MAX_DELAY_MS = 5000
+# app_data.json keys written out fully indented, for reading and hand-editing;
+# the others (cells, template table) get one compact line per entry
+READABLE_KEYS = ("categories",)
+
+# json.dumps without its per-call argument handling, for the one-line entries
+_encode = json.JSONEncoder().encode
+
+
+def atomic_write_json(path, data, indent=None):
+    # Unindented by default: compact cells ([id, values]) would otherwise take
+    # several lines each. Serialized in one go, see chunkstore._write_json.
+    text = json.dumps(data, indent=indent)
+    atomic_write(path, lambda f: f.write(text), suffix=".json")
+
+
+def atomic_write_data(path, data):
+    # app_data.json, see data_to_text
+    text = data_to_text(data)
+    atomic_write(path, lambda f: f.write(text), suffix=".json")
+
+
+def data_to_text(data, indent=4):
+    # Indented like json.dump(data, f, indent=4), except that entries of the
+    # big sections stay on one line each: an indented [id, values] cell would
+    # take several, and json.dumps with indent runs the pure Python encoder
+    pad = " " * indent
+    items = []
+    for key, value in data.items():
+        if key in READABLE_KEYS or not value or not isinstance(value, (dict, list)):
+            text = json.dumps(value, indent=indent).replace("\n", "\n" + pad)
+        elif isinstance(value, dict):
+            text = "{\n" + ",\n".join(f"{pad}{pad}{_encode(k)}: {_encode(v)}" for k, v in value.items()) + f"\n{pad}}}"
+        else:
+            text = "[\n" + ",\n".join(f"{pad}{pad}{_encode(v)}" for v in value) + f"\n{pad}]"
+        items.append(f"{pad}{_encode(key)}: {text}")
+    return "{\n" + ",\n".join(items) + "\n}" if items else "{}"
+
+
+def atomic_write(path, write, suffix=".tmp", binary=False):
+    # write(f) fills a temp file next to the target, which is then renamed over
+    # the old one. os.replace is atomic, so a crash (or an exception, e.g. a
+    # cancelled export) halfway through leaves the previous file untouched
+    # instead of a truncated one.
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=suffix, dir=directory)
+    try:
+        with (os.fdopen(fd, "wb") if binary else os.fdopen(fd, "w", encoding="utf-8")) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class DebouncedStore:
+    # Write-behind persistence for the app data.
+    # Edits only call mark_dirty(); the actual write happens once, after
+    # delay_ms of quiet (or max_delay_ms at the latest), or when flush() is
+    # called explicitly (e.g. on exit).
+    # schedule/cancel are Tk's after/after_cancel so the flush runs on the Tk thread.
+    # Without them (headless use) nothing is written until flush() is called.
+    #
+    # With a journal, small edits go through record() and only the edit itself
+    # is appended on flush; mark_dirty() still means "rewrite the whole file".
+
+    def __init__(self, path, get_data, schedule, cancel,
+                 delay_ms=DEFAULT_SAVE_DELAY_MS, max_delay_ms=DEFAULT_MAX_DELAY_MS, journal=None):
+        self.path = path
+        self.get_data = get_data
+        self.schedule = schedule
+        self.cancel = cancel
+        self.delay_ms = delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.journal = journal
+        # on_write(kind, bytes, seconds) after each file write, for instrumentation
+        self.on_write = None
+
+        self.dirty = False
+        self._pending = None
+        self._dirty_since = None
+
+    def mark_dirty(self):
+        self.dirty = True
+        self._schedule()
+
+    def record(self, op):
+        if self.journal is None:
+            self.mark_dirty()
+            return
+        self.journal.record(op)
+        self._schedule()
+
+    def _schedule(self):
+        if self.schedule is None:
+            return
+        now = time.monotonic()
+        if self._dirty_since is None:
+            self._dirty_since = now
+
+        # Already waited long enough, keep the scheduled flush instead of postponing it
+        waited_ms = (now - self._dirty_since) * 1000
+        if self._pending is not None and waited_ms >= self.max_delay_ms:
+            return
+
+        if self._pending is not None:
+            self.cancel(self._pending)
+        delay = min(self.delay_ms, max(0, int(self.max_delay_ms - waited_ms)))
+        self._pending = self.schedule(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._pending = None
+        self.flush()
+
+    def flush(self):
+        if self._pending is not None:
+            self.cancel(self._pending)
+            self._pending = None
+        start = time.perf_counter()
+        if self.dirty:
+            if self.journal is not None:
+                self.journal.checkpoint(self.get_data())
+            else:
+                atomic_write_data(self.path, self.get_data())
+            self.dirty = False
+            if self.on_write is not None:
+                self.on_write("snapshot", os.path.getsize(self.path), time.perf_counter() - start)
+        elif self.journal is not None:
+            written = self.journal.flush()
+            if written and self.on_write is not None:
+                self.on_write("journal", written, time.perf_counter() - start)
+        self._dirty_since = None
+
+    def close(self):
+        # Exit path: leave a self-contained app_data.json behind
+        self.flush()
+        if self.journal is not None and self.journal.has_records():
+            self.journal.checkpoint(self.get_data())
@@ -0,0 +1,66 @@
+import queue
+import threading
+
+# Long file jobs (import, export, save) run on a worker thread. The worker
+# never touches Tk or the live data: it reports through a queue that the Tk
+# thread drains from an after() callback, and results are applied there.
+
+# Progress messages are sent at most this many times per job
+PROGRESS_STEPS = 200
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class BackgroundTask:
+    # work(task) runs on the worker thread and may call task.progress(done, total),
+    # which also raises TaskCancelled once cancel() was called from the Tk thread.
+    # poll() returns the messages queued so far:
+    #   ("progress", done, total), ("done", result), ("error", exc), ("cancelled",)
+
+    def __init__(self, work):
+        self.work = work
+        self.messages = queue.Queue()
+        self._cancel = threading.Event()
+        self._last_step = -1
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise TaskCancelled()
+
+    def progress(self, done, total):
+        self.check()
+        step = done * PROGRESS_STEPS // total if total else 0
+        if step != self._last_step or done == total:
+            self._last_step = step
+            self.messages.put(("progress", done, total))
+
+    def _run(self):
+        try:
+            result = self.work(self)
+        except TaskCancelled:
+            self.messages.put(("cancelled",))
+        except Exception as e:
+            self.messages.put(("error", e))
+        else:
+            self.messages.put(("done", result))
+
+    def poll(self):
+        items = []
+        while True:
+            try:
+                items.append(self.messages.get_nowait())
+            except queue.Empty:
+                return items
@@ -0,0 +1,83 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# Placeholders: ..0.. (text), .c0c. (color), .i0i. (int), .s0s. (symbol), .select:key=tmpl,... (optional)
+PLACEHOLDER_PATTERN = re.compile(r"(\.\.0\.\.|\.c0c\.|\.i0i\.|\.s0s\.|\.select:[^,]+(?:,[^,]+)*)")
+
+PLACEHOLDER_KINDS = {
+    "..0..": "entry",
+    ".c0c.": "color",
+    ".i0i.": "int",
+    ".s0s.": "symbol",
+}
+
+# Distinct box contents kept parsed at once
+TEMPLATE_CACHE_SIZE = 4096
+
+# kind: "static", "entry", "color", "int", "symbol" or "select"
+# text: the raw part of the content; options: SelectOption tuple for "select"
+Token = namedtuple("Token", "kind text options")
+# kind of the input inside the option: "int", "symbol" or "entry"
+SelectOption = namedtuple("SelectOption", "label template kind")
+# slots: how many entries of a cell's "values" the template uses
+Template = namedtuple("Template", "tokens slots")
+
+
+def _parse_select(part):
+    options = []
+    for opt in part[8:].split(','):
+        if "=" not in opt: continue
+        label, template = opt.split("=", 1)
+        kind = {".i0i.": "int", ".s0s.": "symbol"}.get(template, "entry")
+        options.append(SelectOption(label, template, kind))
+    return tuple(options)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(content):
+    # Parsed once per distinct content; both the grid and the exporter use it
+    tokens = []
+    slots = 0
+    for part in PLACEHOLDER_PATTERN.split(content):
+        if not part: continue
+        if part in PLACEHOLDER_KINDS:
+            tokens.append(Token(PLACEHOLDER_KINDS[part], part, ()))
+            slots += 1
+        elif part.startswith(".select:"):
+            options = _parse_select(part)
+            tokens.append(Token("select", part, options))
+            slots += len(options)
+        else:
+            tokens.append(Token("static", part, ()))
+    return Template(tuple(tokens), slots)
+
+
+def split_select_value(raw):
+    # Select slots are stored as "1|value" (enabled) or "0|value"
+    try:
+        enabled, val = raw.split("|", 1)
+    except (AttributeError, ValueError):
+        return "0", ""
+    return enabled, val
+
+
+def fill_template(content, values):
+    # Export text of one cell
+    result = []
+    value_idx = 0
+    for token in compile_template(content).tokens:
+        if token.kind == "static":
+            result.append(token.text)
+        elif token.kind == "select":
+            for opt in token.options:
+                raw_val = values[value_idx] if value_idx < len(values) else "0|"
+                enabled, val = split_select_value(raw_val)
+                if enabled == "1":
+                    result.append(f"{opt.label}={val} ")
+                value_idx += 1
+        else:
+            val = values[value_idx] if value_idx < len(values) else ""
+            result.append(str(val))
+            value_idx += 1
+    return "".join(result)
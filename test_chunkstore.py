@@ -0,0 +1,87 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from exporter import export_to_file
+from model import WorkspaceModel
+
+# Snapshots and export plans of a chunk store read the chunk files as they were
+# when they were taken, whatever the Tk thread writes meanwhile.
+#   python -m unittest test_chunkstore
+
+ROWS = 3000
+BOX = {"content": "x = ..0..", "color": "#ffffff"}
+
+
+def export_text(workspace):
+    out = io.StringIO()
+    export_to_file(workspace, out)
+    return out.getvalue()
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="kutu-test-")
+        self.data_file = os.path.join(self.root, "app_data.json")
+        with open(self.data_file, "w", encoding="utf-8") as f:
+            json.dump({"categories": [{"name": "test", "boxes": [BOX]}], "workspace": {}}, f)
+        model = WorkspaceModel(self.data_file, chunk_threshold=10)
+        for r in range(ROWS):
+            model.drop_box(r, 0, BOX)
+        model.close()
+        # Reopened: the workspace is a chunk store with nothing loaded
+        self.model = WorkspaceModel(self.data_file, chunk_threshold=10)
+        self.assertTrue(self.model.is_chunked())
+        self.assertIn(1, self.model.workspace.unloaded)
+        self.before = self.snapshot_text()
+
+    def tearDown(self):
+        self.model.close()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def snapshot_text(self):
+        snapshot = self.model.snapshot()
+        try:
+            return export_text(snapshot)
+        finally:
+            snapshot.close()
+
+    def pinned_dirs(self):
+        return [name for name in os.listdir(self.root) if ".pinned-" in name]
+
+    def test_checkpoint_after_snapshot(self):
+        snapshot = self.model.snapshot()
+        self.model.update_row_value("1_0", 0, "changed")
+        self.model.save_data()
+        self.model.flush()
+        self.assertEqual(export_text(snapshot), self.before)
+        snapshot.close()
+        self.assertEqual(self.pinned_dirs(), [])
+        self.assertIn("changed", self.snapshot_text())
+
+    def test_eviction_after_snapshot(self):
+        snapshot = self.model.snapshot()
+        self.model.workspace.max_chunks = 1
+        self.model.update_row_value("1_0", 0, "changed")
+        self.model.workspace.get_cell(ROWS - 1, 0)
+        self.assertNotIn(0, self.model.workspace.loaded)
+        self.assertEqual(export_text(snapshot), self.before)
+        snapshot.close()
+
+    def test_checkpoint_after_export_plan(self):
+        plan = self.model.export_plan()
+        self.model.update_row_value("1_0", 0, "changed")
+        self.model.save_data()
+        self.model.flush()
+        out = io.StringIO()
+        plan.write(out)
+        self.assertEqual(out.getvalue(), self.before)
+        self.assertEqual(self.pinned_dirs(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
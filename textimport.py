@@ -0,0 +1,313 @@
+import heapq
+import re
+from bisect import bisect_left
+from collections import deque
+
+from cells import Cell, intern_template
+from templates import compile_template
+
+# Reverse of the exporter: text written by Export back into cells.
+#
+# Every line is one grid row, its cells rendered left to right. The static
+# parts of all box templates go into one Aho-Corasick automaton, so a single
+# pass over a line finds every literal in it. Only templates whose literals
+# all occur in the line are candidates, and only those get their regex tried,
+# whatever the number of templates in the palette.
+
+# Cells for lines no template matches keep the line as their (static) content
+UNMATCHED_COLOR = "#dddddd"
+# End positions tried per template and start, nearest first. A value that holds
+# this many copies of the template's own fixed text isn't told apart from
+# several cells any more; without a bound a line costs cubic time in its cells.
+MAX_END_TRIES = 8
+
+# What an input of each kind can hold (see validate_int / validate_sym in app.py)
+SLOT_PATTERNS = {
+    "entry": ".*?",
+    "color": ".*?",
+    "int": r"-?\d*",
+    "symbol": r"(?:[^\w]|_)*",
+}
+
+
+class LiteralIndex:
+    # Aho-Corasick automaton over a list of strings; find(text) yields
+    # (start, literal id) for every occurrence, overlapping ones included
+
+    def __init__(self, literals):
+        self.lengths = [len(text) for text in literals]
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for lid, text in enumerate(literals):
+            node = 0
+            for ch in text:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = nxt
+            self.out[node].append(lid)
+
+        # Failure links breadth first; a node also reports what its fallback reports
+        pending = deque(self.goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for ch, nxt in self.goto[node].items():
+                pending.append(nxt)
+                fallback = self.fail[node]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def find(self, text):
+        goto, fail, out, lengths = self.goto, self.fail, self.out, self.lengths
+        node = 0
+        for end, ch in enumerate(text, 1):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for lid in out[node]:
+                yield end - lengths[lid], lid
+
+
+class TemplateEntry:
+    # One distinct box content with its literals and (compiled on first use) regex
+
+    __slots__ = ("template", "tokens", "literals", "order", "lead", "tail", "weight", "_regex")
+
+    def __init__(self, content, color, literal_ids):
+        self.template = intern_template(content, color)
+        self.tokens = compile_template(content).tokens
+        static = [token.text for token in self.tokens if token.kind == "static"]
+        self.literals = frozenset(literal_ids[text] for text in static)
+        # In the order they appear in the cell
+        self.order = [literal_ids[text] for text in static]
+        # Fixed text the cell has to start / end with, if any
+        self.lead = self.tokens[0].text if self.tokens[0].kind == "static" else None
+        self.tail = literal_ids[self.tokens[-1].text] if self.tokens[-1].kind == "static" else None
+        # More fixed text = more specific match
+        self.weight = sum(len(text) for text in static)
+        self._regex = None
+
+    @property
+    def regex(self):
+        if self._regex is None:
+            parts = []
+            for token in self.tokens:
+                if token.kind == "static":
+                    parts.append(re.escape(token.text))
+                elif token.kind == "select":
+                    # Enabled options render as "label=value ", disabled ones not at all
+                    for opt in token.options:
+                        parts.append(f"(?:{re.escape(opt.label)}=({SLOT_PATTERNS[opt.kind]}) )?")
+                else:
+                    parts.append(f"({SLOT_PATTERNS[token.kind]})")
+            self._regex = re.compile("".join(parts), re.DOTALL)
+        return self._regex
+
+    def match(self, text, start, end):
+        # The cell's "values" if text[start:end] is this template filled in, else None
+        m = self.regex.fullmatch(text, start, end)
+        if m is None:
+            return None
+        return self.values(m)
+
+    def match_from(self, text, start):
+        # (end, values) of the plain regex match at start: empty ..0.. inputs,
+        # every select option that fits. None if there's none.
+        m = self.regex.match(text, start)
+        if m is None:
+            return None
+        return m.end(), self.values(m)
+
+    def values(self, m):
+        values = []
+        groups = iter(m.groups())
+        for token in self.tokens:
+            if token.kind == "select":
+                for _ in token.options:
+                    value = next(groups)
+                    values.append("0|" if value is None else "1|" + value)
+            elif token.kind != "static":
+                values.append(next(groups))
+        return values
+
+
+class TemplateMatcher:
+
+    def __init__(self, boxes):
+        # boxes: palette boxes ({"content", "color"}); the first of equal contents wins
+        literal_ids = {}
+        contents = {}
+        for box in boxes:
+            content = box["content"]
+            if not content or content in contents:
+                continue
+            contents[content] = box["color"]
+            for token in compile_template(content).tokens:
+                if token.kind == "static":
+                    literal_ids.setdefault(token.text, len(literal_ids))
+        self.literals = list(literal_ids)
+        self.index = LiteralIndex(self.literals)
+        self.entries = [TemplateEntry(content, color, literal_ids) for content, color in contents.items()]
+        # Each entry is listed under its rarest literal only: ", " or "(" are in
+        # nearly every template, going through all of those for every line
+        # would cost as much as trying each template. Entries without any
+        # literal fit every line.
+        uses = {}
+        for entry in self.entries:
+            for lid in entry.literals:
+                uses[lid] = uses.get(lid, 0) + 1
+        self.by_literal = {}
+        self.always = []
+        for entry in self.entries:
+            if entry.literals:
+                rarest = min(entry.literals, key=lambda lid: (uses[lid], lid))
+                self.by_literal.setdefault(rarest, []).append(entry)
+            else:
+                self.always.append(entry)
+
+    def candidates(self, found):
+        # Entries whose literals all occur in the line, most specific first
+        result = [entry for lid in found for entry in self.by_literal.get(lid, ())
+                  if entry.literals <= found]
+        result.extend(self.always)
+        result.sort(key=lambda entry: -entry.weight)
+        return result
+
+    def parse_line(self, line):
+        # [(entry, values), ...] left to right, or None if no sequence of templates renders the line
+        occurrences = list(self.index.find(line))
+        candidates = self.candidates({lid for _, lid in occurrences})
+        if not candidates:
+            return None
+        # The exporter strips trailing spaces of a row (a last enabled select option ends in one)
+        padded = line + " "
+
+        def match_last(entry, start):
+            values = entry.match(line, start, len(line))
+            if values is None:
+                values = entry.match(padded, start, len(padded))
+            return values
+
+        # A cell ends where its last fixed text does, or, ending in an input, where
+        # the next cell's first fixed text starts (or the line does). The parse
+        # that explains most of the line with fixed template text wins, then the
+        # one with fewer cells: a trailing ..0.. could otherwise swallow every
+        # cell after it.
+        size = len(line)
+        lengths = self.index.lengths
+        starts = {}     # literal id -> sorted start positions
+        tail_ends = {}
+        open_ends = {size}
+        for start, lid in occurrences:
+            starts.setdefault(lid, []).append(start)
+            tail_ends.setdefault(lid, []).append(start + lengths[lid])
+            open_ends.add(start)
+        open_ends = sorted(open_ends)
+        # The exporter strips a row's trailing spaces, so the last cell's fixed
+        # text may be cut short at the end of the line
+        for lid, ends in tail_ends.items():
+            text = self.literals[lid]
+            if ends[-1] != size and text != text.rstrip() and line.endswith(text.rstrip()):
+                ends.append(size)
+
+        def first_end(entry, start):
+            # Where the cell's fixed text, found in order from start, ends at the
+            # earliest (the tail literal left out); None if it isn't all there
+            pos = start
+            order = entry.order[:-1] if entry.tail is not None else entry.order
+            for i, lid in enumerate(order):
+                if i == 0 and entry.lead is not None:
+                    pos += lengths[lid]
+                    continue
+                found = starts[lid]
+                j = bisect_left(found, pos)
+                if j == len(found):
+                    return None
+                pos = found[j] + lengths[lid]
+            return pos
+
+        best = {0: (0, 0, None)}    # position -> (-weight, cells, (previous position, entry, values))
+        pending = [0]               # reached positions, visited in order
+        done = set()
+
+        def reach(end, state):
+            if end not in best:
+                heapq.heappush(pending, end)
+            elif state[:2] >= best[end][:2]:
+                return
+            best[end] = state
+
+        while pending:
+            start = heapq.heappop(pending)
+            if start in done or start == size:
+                continue
+            done.add(start)
+            score, cells, _ = best[start]
+            for entry in candidates:
+                if entry.lead is not None and not line.startswith(entry.lead, start):
+                    continue
+                lowest = first_end(entry, start)
+                if lowest is None:
+                    continue
+                if entry.tail is None:
+                    # Ending in an input: where the next cell starts isn't marked by any
+                    # fixed text if that one starts with an input too; the plain match
+                    # (empty text inputs, all select options that fit) gives that end
+                    found = entry.match_from(line, start)
+                    if found is not None and found[0] > start:
+                        reach(found[0], (score - entry.weight, cells + 1, (start, entry, found[1])))
+                    ends = open_ends
+                else:
+                    ends = tail_ends[entry.tail]
+                first = bisect_left(ends, max(lowest, start + 1))
+                for end in ends[first:first + MAX_END_TRIES]:
+                    values = match_last(entry, start) if end == size else entry.match(line, start, end)
+                    if values is not None:
+                        reach(end, (score - entry.weight, cells + 1, (start, entry, values)))
+        finish = best.get(size)
+        if finish is None:
+            return None
+
+        cells = []
+        step = finish[2]
+        while step is not None:
+            start, entry, values = step
+            cells.append((entry, values))
+            step = best[start][2]
+        cells.reverse()
+        return cells
+
+
+def parse_export_lines(lines, matcher, progress=None):
+    # -> (workspace dict {"r_c": Cell}, number of lines no template matched).
+    # Cells of a row go to columns 0, 1, ...: empty columns don't show in the text.
+    # progress(done_lines, total_lines) may raise to abort.
+    workspace = {}
+    unmatched = 0
+    total = len(lines)
+    for r, line in enumerate(lines):
+        if line:
+            cells = matcher.parse_line(line)
+            if cells is None:
+                unmatched += 1
+                workspace[f"{r}_0"] = Cell(intern_template(line, UNMATCHED_COLOR))
+            else:
+                for c, (entry, values) in enumerate(cells):
+                    workspace[f"{r}_{c}"] = Cell(entry.template, values)
+        if progress is not None:
+            progress(r + 1, total)
+    return workspace, unmatched
+
+
+def read_export_text(path, boxes, progress=None):
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    return parse_export_lines(lines, TemplateMatcher(boxes), progress)
@@ -0,0 +1,35 @@
+from collections import defaultdict
+
+
+class WidgetPool:
+    # Free lists of reusable widgets (or small widget groups) by kind.
+    # Callers hide a widget before release() and rebind it after acquire();
+    # hits/misses show how often a render could reuse instead of create.
+    # Past max_free idle items of a kind, released items go to discard() instead.
+
+    def __init__(self, max_free=None, discard=None):
+        self.max_free = max_free
+        self.discard = discard
+        self.free = defaultdict(list)
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    def acquire(self, kind, create):
+        free = self.free[kind]
+        if free:
+            self.hits[kind] += 1
+            return free.pop()
+        self.misses[kind] += 1
+        return create()
+
+    def release(self, kind, item):
+        free = self.free[kind]
+        if self.max_free is not None and len(free) >= self.max_free and self.discard is not None:
+            self.discard(kind, item)
+            return
+        free.append(item)
+
+    def stats(self):
+        kinds = sorted(set(self.hits) | set(self.misses) | set(self.free))
+        return {kind: {"hits": self.hits[kind], "misses": self.misses[kind], "free": len(self.free[kind])}
+                for kind in kinds}
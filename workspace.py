@@ -0,0 +1,294 @@
+import copy
+from bisect import bisect_left, insort
+from collections.abc import MutableMapping
+
+from cells import TEMPLATES_KEY, TemplateTable, cell_from_json, cell_to_json
+
+
+def parse_cell_key(key):
+    # "r_c" -> (r, c), None for keys that aren't grid cells
+    try:
+        r, c = key.split("_")
+        return int(r), int(c)
+    except (AttributeError, ValueError):
+        return None
+
+
+class SparseWorkspace(MutableMapping):
+    # Workspace cells indexed by row: {r: {c: cell}} plus sorted row / column
+    # lists, so occupancy checks, bounds and row iteration don't have to scan
+    # every "r_c" key. It still behaves like the old flat dict keyed by "r_c"
+    # and converts to / from that JSON format with from_json / to_json.
+    # Cells are cells.Cell objects; raw JSON cells are converted on the way in.
+
+    def __init__(self, cells=None, templates=None):
+        self.rows = {}          # r -> {c: cell}
+        self.row_order = []     # sorted row numbers that have cells
+        self.row_cols = {}      # r -> sorted column numbers
+        self.extra = {}         # keys that aren't "r_c", kept as they were
+        self.col_counts = {}    # c -> number of rows using that column
+        self._len = 0
+        self._max_row = -1
+        self._max_col = -1
+        if cells:
+            # templates: the cells.TemplateTable compact [id, values] cells refer to
+            for key, cell in cells.items():
+                pos = parse_cell_key(key)
+                if pos is None:
+                    self.extra[key] = cell
+                else:
+                    self.set_cell(pos[0], pos[1], cell_from_json(cell, templates))
+
+    @classmethod
+    def from_json(cls, workspace, templates=None):
+        if isinstance(workspace, cls):
+            return workspace
+        return cls(workspace, templates)
+
+    def to_json(self, templates=None):
+        # Flat {"r_c": cell} dict, as stored in app_data.json and project files:
+        # [id, values] cells with a cells.TemplateTable, inline dicts without
+        result = {f"{r}_{c}": cell_to_json(cell, templates) for r, c, cell in self.iter_cells()}
+        result.update(self.extra)
+        return result
+
+    def snapshot(self):
+        # Copy that a worker thread can read while this one keeps being edited.
+        # Cells are immutable and shared; only the indexes are copied.
+        snap = copy.copy(self)
+        snap.rows = {r: dict(row) for r, row in self.rows.items()}
+        snap.row_order = list(self.row_order)
+        snap.row_cols = {r: list(cols) for r, cols in self.row_cols.items()}
+        snap.extra = dict(self.extra)
+        snap.col_counts = dict(self.col_counts)
+        return snap
+
+    def close(self):
+        # Nothing to free in memory; see LazyRowWorkspace.close
+        pass
+
+    # --- Cell access by position ---
+
+    def get_cell(self, r, c):
+        row = self.rows.get(r)
+        return row.get(c) if row else None
+
+    def has_row(self, r):
+        return r in self.rows
+
+    def row_count(self, r):
+        # Occupied cells in row r
+        row = self.rows.get(r)
+        return len(row) if row else 0
+
+    def set_cell(self, r, c, cell):
+        row = self.rows.get(r)
+        if row is None:
+            row = self.rows[r] = {}
+            self.row_cols[r] = []
+            insort(self.row_order, r)
+        if c not in row:
+            insort(self.row_cols[r], c)
+            self.col_counts[c] = self.col_counts.get(c, 0) + 1
+            self._len += 1
+        row[c] = cell
+        if r > self._max_row: self._max_row = r
+        if c > self._max_col: self._max_col = c
+
+    def pop_cell(self, r, c):
+        row = self.rows.get(r)
+        if row is None or c not in row:
+            raise KeyError((r, c))
+        cell = row.pop(c)
+        cols = self.row_cols[r]
+        del cols[bisect_left(cols, c)]
+        self._len -= 1
+        self.col_counts[c] -= 1
+        if not self.col_counts[c]:
+            del self.col_counts[c]
+            if c == self._max_col:
+                self._max_col = max(self.col_counts, default=-1)
+        if not row:
+            del self.rows[r]
+            del self.row_cols[r]
+            del self.row_order[bisect_left(self.row_order, r)]
+            if r == self._max_row:
+                self._max_row = self.row_order[-1] if self.row_order else -1
+        return cell
+
+    @property
+    def max_row(self):
+        # Highest occupied row, -1 when empty
+        return self._max_row
+
+    @property
+    def max_col(self):
+        return self._max_col
+
+    def iter_rows(self, start=0, stop=None):
+        # (r, [(c, cell), ...]) for occupied rows in order, optionally a row range
+        lo = bisect_left(self.row_order, start)
+        hi = len(self.row_order) if stop is None else bisect_left(self.row_order, stop)
+        for r in self.row_order[lo:hi]:
+            row = self.rows[r]
+            yield r, [(c, row[c]) for c in self.row_cols[r]]
+
+    def iter_cells(self):
+        for r, cells in self.iter_rows():
+            for c, cell in cells:
+                yield r, c, cell
+
+    # --- MutableMapping over "r_c" keys ---
+
+    def __getitem__(self, key):
+        pos = parse_cell_key(key)
+        if pos is None:
+            return self.extra[key]
+        cell = self.get_cell(*pos)
+        if cell is None:
+            raise KeyError(key)
+        return cell
+
+    def __setitem__(self, key, cell):
+        pos = parse_cell_key(key)
+        if pos is None:
+            self.extra[key] = cell
+        else:
+            self.set_cell(pos[0], pos[1], cell_from_json(cell))
+
+    def __delitem__(self, key):
+        pos = parse_cell_key(key)
+        if pos is None:
+            del self.extra[key]
+        else:
+            try:
+                self.pop_cell(*pos)
+            except KeyError:
+                raise KeyError(key) from None
+
+    def __contains__(self, key):
+        pos = parse_cell_key(key)
+        if pos is None:
+            return key in self.extra
+        return self.get_cell(*pos) is not None
+
+    def __iter__(self):
+        for r, c, _ in self.iter_cells():
+            yield f"{r}_{c}"
+        yield from list(self.extra)
+
+    def __len__(self):
+        return self._len + len(self.extra)
+
+
+class LazyRowWorkspace(SparseWorkspace):
+    # Row numbers are known up front, their cells are decoded by
+    # load_row(r) -> [(c, cell), ...] the first time the row is touched.
+    # iter_rows (export) decodes untouched rows on the fly without keeping them.
+    # release() frees what load_row reads from (e.g. a mapped file), see close().
+
+    def __init__(self, row_numbers, load_row, cell_count, max_col, release=None):
+        super().__init__()
+        self.load_row = load_row
+        self.release = release
+        self.row_order = sorted(row_numbers)
+        self.unloaded = set(self.row_order)
+        self._len = cell_count
+        self._max_row = self.row_order[-1] if self.row_order else -1
+        self._max_col = max_col
+
+    def snapshot(self):
+        # Undecoded rows stay undecoded: the file behind load_row doesn't change.
+        # Its source is still this workspace's to close.
+        snap = super().snapshot()
+        snap.unloaded = set(self.unloaded)
+        snap.release = None
+        return snap
+
+    def pin(self):
+        # (load_row, release or None) that reads undecoded rows as they are now,
+        # on another thread; see ChunkedWorkspace.pin
+        return self.load_row, None
+
+    def close(self):
+        # Undecoded rows can't be read afterwards; snapshots share the source
+        # (a ChunkedWorkspace snapshot has its own, see chunkstore.py)
+        if self.release is not None:
+            self.release()
+            self.release = None
+
+    def materialize(self):
+        # Every row decoded, then the source closed: an ordinary in-memory workspace
+        for r in self.row_order:
+            self.ensure_row(r)
+        self.close()
+
+    def ensure_row(self, r):
+        if r not in self.unloaded:
+            return
+        self.unloaded.discard(r)
+        cells = self.load_row(r)
+        self.rows[r] = dict(cells)
+        self.row_cols[r] = [c for c, _ in cells]
+        for c, _ in cells:
+            self.col_counts[c] = self.col_counts.get(c, 0) + 1
+
+    def get_cell(self, r, c):
+        self.ensure_row(r)
+        return super().get_cell(r, c)
+
+    def has_row(self, r):
+        return r in self.rows or r in self.unloaded
+
+    def row_count(self, r):
+        self.ensure_row(r)
+        return super().row_count(r)
+
+    def set_cell(self, r, c, cell):
+        self.ensure_row(r)
+        super().set_cell(r, c, cell)
+
+    def pop_cell(self, r, c):
+        self.ensure_row(r)
+        max_col = self._max_col
+        cell = super().pop_cell(r, c)
+        if self.unloaded:
+            # Column counts only cover decoded rows, keep the known bound
+            self._max_col = max_col
+        return cell
+
+    def iter_rows(self, start=0, stop=None):
+        lo = bisect_left(self.row_order, start)
+        hi = len(self.row_order) if stop is None else bisect_left(self.row_order, stop)
+        for r in self.row_order[lo:hi]:
+            if r in self.unloaded:
+                yield r, self.load_row(r)
+            else:
+                row = self.rows[r]
+                yield r, [(c, row[c]) for c in self.row_cols[r]]
+
+
+def shift_rows(workspace, r, delta):
+    # {"r_c": cell or None} moving rows r and below by delta; with a negative
+    # delta the first -delta of them are dropped. Inserting / deleting rows,
+    # in the model and when the journal replays it.
+    moved = list(workspace.iter_rows(r))
+    cells = {f"{rr}_{c}": None for rr, row in moved for c, _ in row}
+    for rr, row in moved:
+        if rr + delta >= r:
+            for c, cell in row:
+                cells[f"{rr + delta}_{c}"] = cell
+    return cells
+
+
+def project_to_json(workspace):
+    # A project file's document (also the workspace part of app_data.json):
+    # the template table plus the compact cells
+    templates = TemplateTable()
+    cells = SparseWorkspace.from_json(workspace).to_json(templates)
+    return {TEMPLATES_KEY: templates.to_json(), "workspace": cells}
+
+
+def project_from_json(data):
+    # Back from project_to_json's document; without a table the cells are inline
+    return SparseWorkspace.from_json(data.get("workspace", {}), TemplateTable(data.get(TEMPLATES_KEY, ())))